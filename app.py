@@ -1,12 +1,32 @@
 import os
 import re
+import sys
 import uuid
-from io import BytesIO
-from flask import Flask, render_template, request
+import json
+import pickle
+import sqlite3
+import bisect
+import gzip
+import hashlib
+import hmac
+import itertools
+import tempfile
+import threading
+import time
+import multiprocessing
+import contextvars
+import tracemalloc
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
+from functools import lru_cache
+from flask import Flask, render_template, request, jsonify
+import numpy as np
 import pandas as pd
+from pandas.io.parsers import TextParser
 from werkzeug.utils import secure_filename
-from flask import send_file
-from flask import session
+from flask import send_file, Response, stream_with_context
+from flask import session, g
 
 
 
@@ -17,6 +37,173 @@ def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+# ---------------- instrumentation ----------------
+# Phases of a request (or background job) are timed with `with timed("parse"):`.
+# Outside a collect_phases() block timed() is a no-op. With METRICS_TRACE_MEMORY=1
+# tracemalloc also gives each phase its peak allocation (it slows allocation-
+# heavy phases such as parsing, hence off by default). tracemalloc's peak is
+# process-wide, so a phase only gets a peak_mb if no other phase ran in the
+# process meanwhile (other threads' requests, REPORT_PARALLEL sections); read
+# peaks from runs of one request at a time, e.g. a single worker thread.
+METRICS_TRACE_MEMORY = os.environ.get("METRICS_TRACE_MEMORY", "0") == "1"
+METRICS_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+METRICS_BUCKETS_MB = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS", "0") == "1"   # allow ?profile=1
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "soit_profiles"))
+PROFILE_DISK_MAX_BYTES = int(os.environ.get("PROFILE_DISK_MAX_BYTES", 64 * 1024 * 1024))
+_phases = contextvars.ContextVar("phases", default=None)
+_traced = {}   # traced phases now running, by id; any overlap voids their peaks
+_traced_lock = threading.Lock()
+if METRICS_TRACE_MEMORY:
+    tracemalloc.start()
+
+
+@contextmanager
+def timed(name: str):
+    """Record wall time (and peak allocation when traced) of the block as phase `name`."""
+    log = _phases.get()
+    if log is None:
+        yield
+        return
+    phase = {"name": name}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        with _traced_lock:
+            for other in _traced.values():
+                other["overlapped"] = True
+            phase["overlapped"] = bool(_traced)
+            _traced[id(phase)] = phase
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        phase["ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        if tracing:
+            with _traced_lock:
+                del _traced[id(phase)]
+                if not phase.pop("overlapped"):
+                    phase["peak_mb"] = round(max(tracemalloc.get_traced_memory()[1] - base, 0) / 2**20, 2)
+        log.append(phase)
+
+
+@contextmanager
+def collect_phases():
+    """Collect timed() phases into the yielded list; they also reach any enclosing collector."""
+    outer = _phases.get()
+    log = []
+    token = _phases.set(log)
+    try:
+        yield log
+    finally:
+        _phases.reset(token)
+        if outer is not None:
+            outer.extend(log)
+
+
+def server_timing(phases: list) -> str:
+    """Server-Timing header value for a list of phases."""
+    parts = []
+    for p in phases:
+        entry = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', p['name'])};dur={p['ms']}"
+        if "peak_mb" in p:
+            entry += f';desc="peak {p["peak_mb"]} MB"'
+        parts.append(entry)
+    return ", ".join(parts)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus style: counts of observations <= bound)."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot: +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def to_dict(self) -> dict:
+        running, buckets = 0, []
+        for bound, n in zip(self.bounds + ("+Inf",), self.counts):
+            running += n
+            buckets.append({"le": bound, "count": running})
+        return {"count": self.count, "sum": round(self.sum, 2), "buckets": buckets}
+
+
+class PhaseMetrics:
+    """Per-process (endpoint, phase) histograms of wall time and peak allocation."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ms = {}
+        self._mb = {}
+
+    def observe(self, endpoint: str, phases: list):
+        with self._lock:
+            for p in phases:
+                key = (endpoint, p["name"])
+                self._ms.setdefault(key, Histogram(METRICS_BUCKETS_MS)).observe(p["ms"])
+                if "peak_mb" in p:
+                    self._mb.setdefault(key, Histogram(METRICS_BUCKETS_MB)).observe(p["peak_mb"])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            out = {}
+            for (endpoint, name), hist in sorted(self._ms.items()):
+                entry = out.setdefault(endpoint, {})[name] = {"ms": hist.to_dict()}
+                if (endpoint, name) in self._mb:
+                    entry["peak_mb"] = self._mb[(endpoint, name)].to_dict()
+            return out
+
+
+phase_metrics = PhaseMetrics()
+
+
+class SamplingProfiler:
+    """Samples one thread's stack every PROFILE_INTERVAL into collapsed ("folded") stacks."""
+
+    def __init__(self, thread_id: int, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                stack = ";".join(reversed(names))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def stop(self, label: str) -> str:
+        """Stop sampling and write the folded stacks under PROFILE_DIR; returns the file name."""
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.folded"
+        with open(os.path.join(PROFILE_DIR, name), "w") as fh:
+            for stack, n in sorted(self.stacks.items(), key=lambda kv: -kv[1]):
+                fh.write(f"{stack} {n}\n")
+        _prune_dir(PROFILE_DIR, PROFILE_DISK_MAX_BYTES)
+        return name
+
+
 # ---------------- helpers ----------------
 def _sid(x) -> str:
     """Normalize student id (strip .0 etc)."""
@@ -42,107 +229,158 @@ def _canon_qual(x: str) -> str:
         return "HCS"
     return s if s else "Unknown"
     
+def _sid_series(s: pd.Series) -> pd.Series:
+    """Vectorized _sid: normalize each distinct value once, then map back."""
+    codes, uniques = pd.factorize(s)
+    labels = [_sid(u) for u in uniques] + [""]  # code -1 (missing) -> ""
+    return pd.Series(labels, dtype=object).take(codes).set_axis(s.index)
+
+
+def _first_str(grouped_col) -> pd.Series:
+    """First non-null value per group, as str (what .dropna().astype(str).iloc[0] gave)."""
+    return grouped_col.first().dropna().astype(str)
+
+
+def _join_unique(df: pd.DataFrame, col: str, strip: bool = False) -> pd.Series:
+    """Per-student " | "-joined distinct non-null values, in order of appearance."""
+    vals = df[col].dropna().astype(str)
+    if strip:
+        vals = vals.str.strip()
+    pairs = pd.DataFrame({"_sid": df.loc[vals.index, "_sid"], "v": vals}).drop_duplicates()
+    return pairs.groupby("_sid", sort=False)["v"].agg(" | ".join)
+
+
+def _join_sorted(df: pd.DataFrame, key: str, col: str, sep: str) -> pd.Series:
+    """Per-key sep-joined sorted distinct non-null values of col."""
+    pairs = pd.DataFrame({"k": df[key], "v": df[col]}).dropna()
+    pairs = pairs.assign(v=pairs["v"].astype(str)).drop_duplicates()
+    return pairs.sort_values("v", kind="stable").groupby("k", sort=False, observed=True)["v"].agg(sep.join)
+
+
+TRACKER_REASONS = [
+    # (substring in the lower-cased reason, tracker label)
+    ("canvas activity", "Engagement – Canvas"),
+    ("class attendance", "Engagement – Attendance"),
+    ("non-participation", "Missing assessment"),
+    ("poor participation", "Assessment – Failure"),
+]
+
+
+# ---------------- reason classification ----------------
+# Reason columns hold a handful of distinct texts over many rows, so each text
+# is classified once (and remembered across uploads); rows get their flags by
+# indexing a small per-text table with the column's factorized codes.
+ATTENDANCE_RX = re.compile(r"(absent|no\s*show|did\s*not\s*attend|not\s*attend|missed\s*class|attendance)", re.I)
+REASON_RULES = {
+    "attendance": lambda t: ATTENDANCE_RX.search(t) is not None,
+    "canvas_007": lambda t: "canvas activity_007" in t.lower(),
+    "non_participation_006": lambda t: "non-participation in formal assessment_006" in t.lower(),
+    "poor_participation_006": lambda t: "poor participation in formal assessment_006" in t.lower(),
+    # one flag per tracker label
+    **{label: (lambda t, needle=needle: needle in t.lower()) for needle, label in TRACKER_REASONS},
+}
+REASON_CACHE_MAX = int(os.environ.get("REASON_CACHE_MAX", 50_000))
+
+
+class ReasonClassifier:
+    """REASON_RULES flags per distinct reason text, memoized (LRU) for the life of the process."""
+
+    def __init__(self, rules: dict, max_entries: int = REASON_CACHE_MAX):
+        self.rules = rules
+        self.names = list(rules)
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def classify(self, text: str) -> tuple:
+        with self._lock:
+            hit = self._cache.get(text)
+            if hit is not None:
+                self._cache.move_to_end(text)
+                return hit
+        flags = tuple(bool(rule(text)) for rule in self.rules.values())
+        with self._lock:
+            self._cache[text] = flags
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return flags
+
+    def flags(self, reasons: pd.Series) -> pd.DataFrame:
+        """Boolean frame (one column per rule) aligned with `reasons`; missing reasons match nothing."""
+        codes, uniques = pd.factorize(reasons)
+        table = np.zeros((len(uniques) + 1, len(self.names)), dtype=bool)  # last row: code -1 (missing)
+        for i, text in enumerate(uniques):
+            table[i] = self.classify(str(text))
+        return pd.DataFrame(table[codes], index=reasons.index, columns=self.names)
+
+
+reason_classifier = ReasonClassifier(REASON_RULES)
+
+
 def transform_to_tracker(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     df.columns = [str(c).strip() for c in df.columns]
 
     # ---- safely find columns ----
-    def get_col(name):
-        return next((c for c in df.columns if name.lower() in c.lower()), None)
-
-    col_student = get_col("student number")
-    col_qual    = get_col("qualification")
-    col_year    = get_col("year")
-    col_risk    = get_col("risk")
-    col_notes   = get_col("notes")
-    col_reason = get_col("reason")
-    col_interv = next(
-        (c for c in df.columns if "intervention" in c.lower()),
-        None
-    )
+    cols = resolve_columns(df.columns, "tracker")
+    col_student = cols["student"]
+    col_qual    = cols["qual"]
+    col_year    = cols["year"]
+    col_risk    = cols["risk"]
+    col_notes   = cols["notes"]
+    col_reason  = cols["reason"]
+    col_interv  = cols["interv"]
 
     if not col_student or not col_risk:
         raise ValueError("Required columns (Student Number / Risk) not found.")
 
-    reason_map = {
-        "canvas activity": "Engagement – Canvas",
-        "class attendance": "Engagement – Attendance",
-        "non-participation": "Missing assessment",
-        "poor participation": "Assessment – Failure"
-    }
-
     # ---- clean student number ----
-    df["_sid"] = df[col_student].apply(_sid)
+    df["_sid"] = _sid_series(df[col_student])
 
     # ---- KEEP ONLY HIGH RISK ----
-    df_high = df[df[col_risk].astype(str).str.contains("high", case=False, na=False)].copy()
+    df_high = df[df[col_risk].astype(str).str.contains("high", case=False, na=False)]
 
     if df_high.empty:
         raise ValueError("No HIGH risk students found in the file.")
 
-    # ---- group by student (removes duplicates) ----
+    # ---- one row per student (removes duplicates), every field a grouped reduction ----
     grouped = df_high.groupby("_sid")
+    sids = pd.Index(grouped.size().index)
 
-    rows = []
-
-    for sid, g in grouped:
-        programme = g[col_qual].dropna().astype(str).iloc[0] if col_qual else ""
-        year = ""
-        if col_year:
-            vals = g[col_year].dropna().astype(str)
-            if not vals.empty:
-                raw_year = vals.iloc[0]
-                year = re.sub(r"\D", "", raw_year)
-
-        # combine interventions
-        lecturer_action = ""
-        if col_interv:
-            lecturer_action = " | ".join(
-                g[col_interv]
-                .dropna()
-                .astype(str)
-                .str.strip()
-                .unique()
-            )
+    def per_student(values: pd.Series) -> pd.Series:
+        return values.reindex(sids, fill_value="")
 
-        # combine notes
-        notes = ""
-        if col_notes:
-            notes = " | ".join(g[col_notes].dropna().astype(str).unique())
-
-        risk_value = ""
-
-        if col_reason:
-            reasons = g[col_reason].dropna().astype(str).str.lower()
-
-            mapped = []
-
-            for r in reasons:
-                if "canvas activity" in r:
-                    mapped.append(reason_map["canvas activity"])
-                if "class attendance" in r:
-                    mapped.append(reason_map["class attendance"])
-                if "non-participation" in r:
-                    mapped.append(reason_map["non-participation"])
-                if "poor participation" in r:
-                    mapped.append(reason_map["poor participation"])
-
-            # remove duplicates + keep clean
-            risk_value = " | ".join(sorted(set(mapped))) if mapped else "Other"
-        rows.append({
-            "Student Number": sid,
-            "Date": pd.Timestamp.today().strftime("%Y-%m-%d"),
-            "Programme": programme,
-            "Year of study": year,
-            "Risk": risk_value,
-            "Action Taken by Lecturer": lecturer_action,
-            "Action Taken by Academic Manager": "",
-            "Action Taken by Programme Officer": "",
-            "Action Taken by C4AS Manager": "",
-            "Notes": notes
-        })
-
-    new_df = pd.DataFrame(rows)
+    programme = per_student(_first_str(grouped[col_qual])) if col_qual else ""
+    year = ""
+    if col_year:
+        year = per_student(_first_str(grouped[col_year]).str.replace(r"\D", "", regex=True))
+
+    # combine interventions / notes
+    lecturer_action = per_student(_join_unique(df_high, col_interv, strip=True)) if col_interv else ""
+    notes = per_student(_join_unique(df_high, col_notes)) if col_notes else ""
+
+    risk_value = ""
+    if col_reason:
+        flags = reason_classifier.flags(df_high[col_reason])[[label for _, label in TRACKER_REASONS]]
+        flags = flags.groupby(df_high["_sid"]).any().reindex(sids, fill_value=False)
+        # sorted, de-duplicated labels per student; "Other" when nothing matched
+        risk_value = pd.Series("", index=sids)
+        for label in sorted(flags.columns):
+            risk_value = risk_value.mask(flags[label], risk_value + " | " + label)
+        risk_value = risk_value.str.removeprefix(" | ").replace("", "Other")
+
+    new_df = pd.DataFrame({
+        "Student Number": sids,
+        "Date": pd.Timestamp.today().strftime("%Y-%m-%d"),
+        "Programme": programme,
+        "Year of study": year,
+        "Risk": risk_value,
+        "Action Taken by Lecturer": lecturer_action,
+        "Action Taken by Academic Manager": "",
+        "Action Taken by Programme Officer": "",
+        "Action Taken by C4AS Manager": "",
+        "Notes": notes
+    }, index=sids).reset_index(drop=True)
 
     # ---- FINAL SAFETY: remove any accidental duplicates ----
     new_df = new_df.drop_duplicates(subset=["Student Number"])
@@ -150,6 +388,71 @@ def transform_to_tracker(df: pd.DataFrame) -> pd.DataFrame:
     return new_df
 
 
+# ---------------- exports ----------------
+# Shared by the routes, the background jobs and batch.py. Exports are written
+# chunk by chunk into a file (openpyxl write-only mode for .xlsx) and streamed
+# from there, so neither a whole workbook nor a second copy of the rows sits in
+# memory; CSV is produced and sent incrementally, Parquet is the compact option.
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_CHUNK_ROWS = int(os.environ.get("EXPORT_CHUNK_ROWS", 5000))
+STREAM_BLOCK_BYTES = 256 * 1024
+
+
+def _export_rows(df: pd.DataFrame):
+    """Rows as lists of plain cell values (missing -> None), EXPORT_CHUNK_ROWS at a time."""
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS].astype(object)
+        yield from chunk.where(chunk.notna(), None).itertuples(index=False, name=None)
+
+
+def iter_csv(df: pd.DataFrame):
+    """A frame as CSV bytes, header first, EXPORT_CHUNK_ROWS per piece."""
+    yield df.iloc[:0].to_csv(index=False).encode()
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXPORT_CHUNK_ROWS].to_csv(index=False, header=False).encode()
+
+
+def write_export(df: pd.DataFrame, fh, fmt: str = "xlsx", sheet: str = "Sheet1"):
+    """Write df to the binary file object fh as xlsx, csv or parquet."""
+    if fmt == "xlsx":
+        from openpyxl import Workbook
+
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(sheet)
+        ws.append([str(c) for c in df.columns])
+        for row in _export_rows(df):
+            ws.append(row)
+        wb.save(fh)
+    elif fmt == "csv":
+        for piece in iter_csv(df):
+            fh.write(piece)
+    elif fmt == "parquet":
+        df.to_parquet(fh, index=False)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+
+def stream_file(path: str, remove: bool = False):
+    """Yield a file in STREAM_BLOCK_BYTES blocks, deleting it afterwards if asked."""
+    try:
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(STREAM_BLOCK_BYTES), b""):
+                yield block
+    finally:
+        if remove:
+            os.remove(path)
+
+
+def high_risk_frame(report: dict):
+    """A report's high-risk students as a frame, or None when there are none."""
+    high_risk = report.get("high_risk_students", [])
+    return pd.DataFrame(high_risk) if high_risk else None
+
+
 def _counts(series: pd.Series) -> dict:
     out = {}
     for k, v in series.items():
@@ -165,38 +468,42 @@ def _sort_weeks_like(weeks) -> list:
 
 
 # ---------------- cleaning ----------------
-def _strip_obj_cols(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    for c in df.columns:
-        if pd.api.types.is_object_dtype(df[c]):
-            df[c] = df[c].astype(str).str.strip()
-            df[c].replace({"": pd.NA}, inplace=True)
-    return df
+# Cleaning allocates only the text columns it actually changes: the result
+# shares every other column with the input (pandas copy-on-write) and rows are
+# filtered only when some are fully empty. Peak allocation (Python + Arrow)
+# stays within CLEAN_PEAK_RATIO x the input frame; bench.py --check enforces it.
+CLEAN_PEAK_RATIO = 1.5
+
+
+def _normalize_text(s: pd.Series) -> pd.Series:
+    """Stripped strings with blanks as real missing values (missing stays missing, never "nan")."""
+    if pd.api.types.is_object_dtype(s):
+        # mixed cells -> text; pandas < 3 turns missing cells into "nan" here, so re-mask them
+        s = s.astype(str).mask(s.isna())
+    s = s.str.strip()
+    return s.mask(s == "")
 
 
 def clean_dataframe(df: pd.DataFrame):
     # Clean raw Excel into valid records:
     # - Trim column names and string cells
+    # - Blank cells become real missing values
     # - Drop fully-empty rows
     # - Keep rows even if Student Number is missing (for catalogue parity)
     # - No deduplication
-    stats = {}
-    df0 = df.copy()
-    df0.columns = [str(c).strip() for c in df0.columns]
-    stats["rows_raw"] = int(len(df0))
-
-    # Strip whitespace in object columns and normalize blanks to NA
-    def _strip_obj_cols(df_in: pd.DataFrame) -> pd.DataFrame:
-        df_in = df_in.copy()
-        for c in df_in.columns:
-            if pd.api.types.is_object_dtype(df_in[c]):
-                df_in[c] = df_in[c].astype(str).str.strip()
-                df_in[c].replace({"": pd.NA}, inplace=True)
-        return df_in
-
-    df1 = _strip_obj_cols(df0)
-    df1 = df1.dropna(how="all")
-    stats["rows_after_drop_all_empty"] = int(len(df1))
+    stats = {"rows_raw": int(len(df))}
+    out = df.set_axis([str(c).strip() for c in df.columns], axis=1)
+    for i in range(out.shape[1]):
+        col = out.iloc[:, i]
+        if pd.api.types.is_object_dtype(col) or pd.api.types.is_string_dtype(col):
+            norm = _normalize_text(col)
+            if not norm.equals(col):  # already-clean columns stay shared with the input
+                out.isetitem(i, norm)
+
+    keep = out.notna().any(axis=1)
+    if not keep.all():
+        out = out[keep]
+    stats["rows_after_drop_all_empty"] = int(len(out))
 
     # No dropping based on Student Number
     stats["dropped_missing_student_number"] = 0
@@ -204,129 +511,228 @@ def clean_dataframe(df: pd.DataFrame):
     # No deduplication to preserve raw record counts
     stats["dropped_duplicates_full_row"] = 0
 
-    stats["rows_final"] = int(len(df1))
-    return df1, stats
+    stats["rows_final"] = int(len(out))
+    return out, stats
+
+
+# ---------------- column schema ----------------
+# Roles are resolved once per header signature from these rules (first matching
+# column wins, names stripped). The tracker export keeps its own looser rules.
+REPORT_ROLES = {
+    "student":  lambda c: c.lower().startswith("student number"),
+    "name":     lambda c: c.lower().startswith("student name"),
+    "module":   lambda c: c.lower().startswith("module"),
+    "week":     lambda c: c.lower() == "week",
+    "reason":   lambda c: "reason" in c.lower(),
+    "risk":     lambda c: "risk" in c.lower(),
+    "resolved": lambda c: "resolved" in c.lower(),
+    "interv":   lambda c: "intervention" in c.lower(),
+    "qual":     lambda c: any(k in c.lower() for k in ("qual", "program", "programme", "course")),
+    "year":     lambda c: c == "Year Registered",
+}
+TRACKER_ROLES = {
+    "student": lambda c: "student number" in c.lower(),
+    "qual":    lambda c: "qualification" in c.lower(),
+    "year":    lambda c: "year" in c.lower(),
+    "risk":    lambda c: "risk" in c.lower(),
+    "notes":   lambda c: "notes" in c.lower(),
+    "reason":  lambda c: "reason" in c.lower(),
+    "interv":  lambda c: "intervention" in c.lower(),
+}
+SCHEMAS = {"report": REPORT_ROLES, "tracker": TRACKER_ROLES}
+
+
+@lru_cache(maxsize=256)
+def _resolve_columns(header: tuple, schema: str) -> dict:
+    return {role: next((c for c in header if match(c)), None) for role, match in SCHEMAS[schema].items()}
+
+
+def resolve_columns(columns, schema: str = "report") -> dict:
+    """Column name per role of `schema` (None when the sheet lacks one); cached per header."""
+    return dict(_resolve_columns(tuple(str(c).strip() for c in columns), schema))
+
+
+def _report_columns(columns) -> dict:
+    """Columns build_report reads, by role (None when the sheet lacks one)."""
+    return resolve_columns(columns, "report")
+
+
+def upload_columns(header) -> list:
+    """Positions of the header columns any schema uses, in sheet order (empty if none match)."""
+    names = [str(c).strip() for c in header]
+    used = {c for schema in SCHEMAS for c in resolve_columns(names, schema).values() if c}
+    return [i for i, c in enumerate(names) if c in used]
+
+
+def read_upload(path: str) -> pd.DataFrame:
+    """read_excel of just the columns some role maps to, all as strings (header read first)."""
+    header = pd.read_excel(path, nrows=0).columns
+    usecols = upload_columns(header)
+    if not usecols:
+        return pd.read_excel(path)  # nothing recognisable: keep the whole sheet for the preview
+    return pd.read_excel(path, usecols=usecols, dtype={header[i]: str for i in usecols})
+
+
+PREVIEW_ROWS = 50
+
+
+def read_preview(path: str) -> pd.DataFrame:
+    """The report's sample rows: the first cleaned rows across the sheet's full width, as strings."""
+    if not path.lower().endswith(".xlsx"):
+        preview, _ = clean_dataframe(pd.read_excel(path, nrows=PREVIEW_ROWS, dtype=str))
+        return preview
+    collected = []
+    rows = _excel_rows(path, collected)
+    try:
+        for _ in rows:
+            if len(collected) > PREVIEW_ROWS:
+                break
+    finally:
+        rows.close()
+    return _preview_frame(collected)
+
 
 # ---------------- core report builder ----------------
-def build_report(df: pd.DataFrame) -> dict:
-    # Clean first
-    df, cleaning_stats = clean_dataframe(df)
-    df = df.copy()
-    df.columns = [str(c).strip() for c in df.columns]
+def _nonempty(s):
+    # clean_dataframe already turned blanks into real missing values
+    return s.notna()
+
+
+def _risk_rank(s):
+    s = str(s).lower()
+    if "high" in s or "red" in s: return 3
+    if "med" in s or "amber" in s or "yellow" in s: return 2
+    if "low" in s or "green" in s: return 1
+    return 0
+
+
+def _wcounts(df: pd.DataFrame, col: str, dropna: bool = True) -> pd.Series:
+    """Weighted value_counts over the "_n" row weights (same ordering as value_counts)."""
+    return df.groupby(col, dropna=dropna, sort=False, observed=True)["_n"].sum().sort_values(ascending=False, kind="stable")
+
+
+def _wmode(tmp: pd.DataFrame, col: str, default: str) -> dict:
+    """Per-student most frequent non-null value of col, weighted by "_n" (ties -> smallest, like Series.mode)."""
+    out = dict.fromkeys(pd.unique(tmp["_sid"]), default)
+    sub = tmp[["_sid", col, "_n"]].dropna(subset=[col])
+    if sub.empty:
+        return out
+    sub = sub.assign(**{col: sub[col].astype(str)})
+    w = sub.groupby(["_sid", col], observed=True)["_n"].sum().reset_index()
+    w = w.sort_values(["_sid", "_n", col], ascending=[True, False, True], kind="stable").drop_duplicates("_sid")
+    out.update(zip(w["_sid"], w[col]))
+    return out
 
-    # likely column names
-    col_student = next((c for c in df.columns if c.lower().startswith("student number")), None)
-    col_name    = next((c for c in df.columns if c.lower().startswith("student name")), None)
-    col_module  = next((c for c in df.columns if c.lower().startswith("module")), None)
-    col_week    = next((c for c in df.columns if c.lower() == "week"), None)
-    col_reason  = next((c for c in df.columns if "reason" in c.lower()), None)
-    col_risk    = next((c for c in df.columns if "risk" in c.lower()), None)
-    col_resolved= next((c for c in df.columns if "resolved" in c.lower()), None)
-    col_interv = next((c for c in df.columns if "intervention" in c.lower()), None)
-    col_qual    = next((c for c in df.columns if ("qual" in c.lower()
-                                                  or "program" in c.lower()
-                                                  or "programme" in c.lower()
-                                                  or "course" in c.lower())), None)
 
-    if col_week:
-        df[col_week] = df[col_week].astype(str)
-    if col_qual:
-        df["_qual"] = df[col_qual].map(_canon_qual)
-    else:
-        df["_qual"] = "Unknown"
-
-        # Total records: Student Number present OR (Student Name & Module(s) & Week present)
-    col_student = next((c for c in df.columns if c.lower().startswith("student number")), None)
-    col_name    = next((c for c in df.columns if c.lower().startswith("student name")), None)
-    col_module  = next((c for c in df.columns if c.lower().startswith("module")), None)
-    col_week    = next((c for c in df.columns if c.lower() == "week"), None)
-    def _nonempty(s):
-        return s.astype(str).str.strip().replace({"": pd.NA, "nan": pd.NA}).notna()
-    has_sn = _nonempty(df[col_student]) if col_student else pd.Series([False]*len(df))
-    has_triplet = (
-        (_nonempty(df[col_name]) if col_name else False) &
-        (_nonempty(df[col_module]) if col_module else False) &
-        (_nonempty(df[col_week]) if col_week else False)
-    )
-        # Total records: SN present OR (Name & Module & Week present)
-    col_student = next((c for c in df.columns if c.lower().startswith("student number")), None)
-    col_name    = next((c for c in df.columns if c.lower().startswith("student name")), None)
-    col_module  = next((c for c in df.columns if c.lower().startswith("module")), None)
-    col_week    = next((c for c in df.columns if c.lower() == "week"), None)
-    def _nonempty(s):
-        return s.astype(str).str.strip().replace({"": pd.NA, "nan": pd.NA}).notna()
-    has_sn = _nonempty(df[col_student]) if col_student else pd.Series([False]*len(df))
-    has_triplet = (
-        (_nonempty(df[col_name]) if col_name else False) &
-        (_nonempty(df[col_module]) if col_module else False) &
-        (_nonempty(df[col_week]) if col_week else False)
-    )
-    total_records = int((has_sn | has_triplet).sum())
-    unique_students = int(df[col_student].dropna().astype(str).nunique()) if col_student else 0
+# ---------------- encoding ----------------
+# Right after cleaning, the columns build_report groups on are swapped for
+# pandas categoricals: int codes plus one label table per column. Every
+# group-by then hashes small ints instead of strings, and labels only come
+# back out when the result dicts are written.
+def _student_categorical(raw: pd.Series) -> pd.Categorical:
+    """Normalized student ids (_sid) as a categorical, ordered like the sorted raw ids."""
+    try:
+        codes, uniques = pd.factorize(raw, sort=True)
+    except TypeError:  # numbers mixed with text don't sort
+        codes, uniques = pd.factorize(raw)
+    # several raw spellings (123, "123", "123.0") collapse onto one id
+    sid_codes, sids = pd.factorize(pd.Index([_sid(u) for u in uniques], dtype=object))
+    return pd.Categorical.from_codes(np.append(sid_codes, -1)[codes], categories=sids)
+
+
+def _qual_categorical(raw: pd.Series) -> pd.Categorical:
+    """_canon_qual applied once per distinct value (missing -> "Unknown")."""
+    codes, uniques = pd.factorize(raw)
+    labels = pd.Index([_canon_qual(u) for u in uniques] + ["Unknown"], dtype=object)
+    label_codes, quals = pd.factorize(labels, sort=True)
+    return pd.Categorical.from_codes(label_codes[codes], categories=quals)
+
+
+def _cat_mask(s: pd.Series, pred) -> np.ndarray:
+    """Evaluate a vectorized string predicate on the categories of s, broadcast through the codes."""
+    hits = np.append(np.asarray(pred(s.cat.categories.astype(str).to_series()), dtype=bool), False)
+    return hits[s.cat.codes.to_numpy()]
+
+
+def encode_frame(df: pd.DataFrame, cols: dict) -> pd.DataFrame:
+    """Convert student / module / week / risk and _qual to categoricals, in place."""
+    if cols["student"]:
+        df[cols["student"]] = _student_categorical(df[cols["student"]])
+    df["_qual"] = _qual_categorical(df[cols["qual"]]) if cols["qual"] else pd.Categorical(["Unknown"] * len(df))
+    for role in ("module", "week", "risk"):
+        col = cols[role]
+        if col and col != cols["student"] and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
 
-    # non-attendance mask (tolerant)
-    att_mask = None
-    if col_reason:
-        rx = r"(absent|no\s*show|did\s*not\s*attend|not\s*attend|missed\s*class|attendance)"
-        att_mask = df[col_reason].astype(str).str.contains(rx, flags=re.I, regex=True, na=False)
-
-    # globals
-    risk_counts     = _counts(df[col_risk].value_counts(dropna=False)) if col_risk else {}
-    # Resolved status via Intervention non-empty
-    if "col_interv" in locals() and col_interv:
-        vals = df[col_interv].astype(str).str.strip()
-        yes = int(vals.replace({"": pd.NA, "nan": pd.NA}).notna().sum())
-        no = int(len(vals) - yes)
-        resolved = {"Yes": yes, "No": no}
-        resolved_counts = resolved
-    else:
-        resolved_counts = _counts(df[col_resolved].value_counts(dropna=False)) if col_resolved else {}
-    by_reason       = _counts(df[col_reason].value_counts().head(15)) if col_reason else {}
 
-    weeks   = _sort_weeks_like(df[col_week].dropna().unique()) if col_week else []
-    modules = sorted(df[col_module].dropna().astype(str).unique()) if col_module else []
-    quals   = sorted(pd.unique(df["_qual"]).tolist())
+# ---------------- count cube ----------------
+# One grouped pass over the encoded frame: row weights summed per
+# student x module x week x reason category x risk x resolved (x qualification).
+# The cube is far smaller than the sheet, and every per-module / per-week /
+# per-student count in the report is a cheap group-by over it.
+
+
+def build_cube(df: pd.DataFrame, cols: dict, att_mask=None, truthy=None) -> pd.DataFrame:
+    """Count cube over an encoded frame: whichever of student, module, week, att, risk,
+    resolved and qual the sheet has, plus "_n"."""
+    keys = {role: df[cols[role]] for role in ("student", "module", "week", "risk") if cols[role]}
+    if att_mask is not None:
+        keys["att"] = att_mask
+    if truthy is not None:
+        keys["resolved"] = truthy
+    keys["qual"] = df["_qual"]
+    frame = pd.DataFrame(keys).assign(_n=df["_n"])
+    return frame.groupby(list(keys), observed=True, dropna=False, sort=False)["_n"].sum().reset_index()
+
+
+def cube_metrics(cube: pd.DataFrame) -> dict:
+    """Dashboard module / week aggregates of a count cube (or any slice of one)."""
+    has = set(cube.columns)
+    att = cube[cube["att"]] if "att" in has else None
 
     # module unique students (overall)
     by_module = {}
-    if col_module and col_student:
-        tmp = df.groupby(col_module)[col_student].nunique().sort_values(ascending=False)
+    if {"module", "student"} <= has:
+        tmp = cube.groupby("module", observed=True)["student"].nunique().sort_values(ascending=False)
         by_module = {str(k): int(v) for k, v in tmp.items()}
 
     # non-attendance per module (unique students)
     by_module_att = {}
-    if col_module and col_student and att_mask is not None:
-        tmp = df[att_mask].groupby(col_module)[col_student].nunique().sort_values(ascending=False)
+    if {"module", "student"} <= has and att is not None:
+        tmp = att.groupby("module", observed=True)["student"].nunique().sort_values(ascending=False)
         by_module_att = {str(k): int(v) for k, v in tmp.items()}
     # NEW: total absences per module (count all rows, not unique students)
     by_module_abs_total = {}
-    if col_module and att_mask is not None:
-        tmp2 = df[att_mask].groupby(col_module).size().sort_values(ascending=False)
+    if "module" in has and att is not None:
+        tmp2 = att.groupby("module", observed=True)["_n"].sum().sort_values(ascending=False)
         by_module_abs_total = {str(k): int(v) for k, v in tmp2.items()}
 
     # non-attendance per week (unique students)
     by_week_att = {}
-    if col_week and col_student and att_mask is not None:
-        tmp = df[att_mask].groupby(col_week)[col_student].nunique()
+    if {"week", "student"} <= has and att is not None:
+        tmp = att.groupby("week", observed=True)["student"].nunique()
         by_week_att = {str(k): int(v) for k, v in tmp.items()}
 
     # per (week, module) unique students — all and non-attendance
     by_week_module_all = {}
     by_week_module_att = {}
-    if col_week and col_module:
-        all_g = df.groupby([col_week, col_module])[col_student].nunique()
+    if {"week", "module", "student"} <= has:
+        all_g = cube.groupby(["week", "module"], observed=True)["student"].nunique()
         for (w, m), v in all_g.items():
             by_week_module_all.setdefault(str(w), {})[str(m)] = int(v)
 
-        if att_mask is not None:
-            att_g = df[att_mask].groupby([col_week, col_module])[col_student].nunique()
+        if att is not None:
+            att_g = att.groupby(["week", "module"], observed=True)["student"].nunique()
             for (w, m), v in att_g.items():
                 by_week_module_att.setdefault(str(w), {})[str(m)] = int(v)
 
     # week x risk (for chart)
     week_risk = {}
-    if col_week and col_risk:
-        pivot = df.pivot_table(index=col_week, columns=col_risk, values=col_student, aggfunc="count", fill_value=0)
+    if {"week", "risk"} <= has:
+        # count of rows with a student number, per week x risk
+        counted = cube.assign(_c=cube["_n"].where(cube["student"].notna(), 0) if "student" in has else cube["_n"])
+        pivot = counted.pivot_table(index="week", columns="risk", values="_c", aggfunc="sum", fill_value=0, observed=True)
         pivot = pivot.reindex(_sort_weeks_like(pivot.index.to_series()))
         week_risk = {
             "weeks": [str(x) for x in list(pivot.index)],
@@ -335,253 +741,647 @@ def build_report(df: pd.DataFrame) -> dict:
 
     # resolved rate by week (%)
     resolved_rate = {}
-    if col_week and (("col_interv" in locals() and col_interv) or col_resolved):
-        if ("col_interv" in locals() and col_interv):
-            vals = df[col_interv].astype(str).str.strip()
-            truthy = vals.replace({"": pd.NA, "nan": pd.NA}).notna()
-        else:
-            vals = df[col_resolved].astype(str).str.strip().str.lower()
-            truthy = vals.isin({"yes", "y", "true", "1", "resolved"})
-        grp = df.groupby(col_week)
-        totals = grp.size()
-        trues = grp.apply(lambda g: int(truthy.loc[g.index].sum()))
+    if {"week", "resolved"} <= has:
+        grp = cube.assign(_t=cube["_n"].where(cube["resolved"], 0)).groupby("week", observed=True)
+        totals = grp["_n"].sum()
+        trues = grp["_t"].sum()
         for w in totals.index:
             resolved_rate[str(w)] = round((int(trues.loc[w]) / int(totals.loc[w])) * 100, 1) if int(totals.loc[w]) else 0.0
 
-    # ----- student analytics -----
-    student_enabled = bool(col_student)
-    student_lookup = []
-    ps_modules_att = {}
-    ps_weeks_att = {}
-    ps_risk_module_max = {}
-    ps_week_risk_counts = {}
-
-    # NEW: for heatmap + per-module % (capacity-based)
-    ps_week_module_att = {}          # sid -> module -> week -> absence count
-    student_module_summary = {}      # sid -> list of {module, total_absences, rate}
-    module_week_capacity = {}        # module -> week -> max sessions (derived)
-
-    # build name + qualification maps
-    if student_enabled:
-        tmp = df[[col_student, col_name, "_qual"]].dropna(subset=[col_student]).copy()
-        tmp["_sid"] = tmp[col_student].apply(_sid)
-
-        # names
-        if col_name:
-            nm = tmp.groupby("_sid")[col_name].agg(
-                lambda s: s.dropna().astype(str).mode().iat[0] if not s.dropna().empty else ""
-            )
-            name_map = nm.to_dict()
-        else:
-            name_map = {}
+    return {
+        "by_module": by_module,
+        "by_module_attendance": by_module_att,
+        "by_module_abs_total": by_module_abs_total,
+        "by_week_attendance": by_week_att,
+        "by_week_module_all": by_week_module_all,
+        "by_week_module_attendance": by_week_module_att,
+        "week_risk": week_risk,
+        "resolved_rate": resolved_rate,
+    }
 
-        # quals
-        ql = tmp.groupby("_sid")["_qual"].agg(
-            lambda s: s.dropna().astype(str).mode().iat[0] if not s.dropna().empty else "Unknown"
-        )
-        qual_map = ql.to_dict()
-
-        # student lookup
-        order = pd.unique(df[col_student].dropna().apply(_sid)).tolist()
-        for sid in order:
-            nm = (name_map.get(sid, "") or "").strip()
-            ql = (qual_map.get(sid, "") or "").strip()
-            label = f"{sid} — {nm}" if nm else sid
-            display = f"{label} — [{ql}]" if ql else label
-            student_lookup.append({"id": sid, "label": display, "name": nm, "qual": ql})
-
-        # student non-attendance by module
-        if att_mask is not None and col_module:
-            g = df[att_mask].groupby([col_student, col_module]).size()
-            for (sid_raw, mod), v in g.items():
-                sid = _sid(sid_raw)
-                ps_modules_att.setdefault(sid, {})[str(mod)] = int(v)
-
-        # student non-attendance by week
-        if att_mask is not None and col_week:
-            g = df[att_mask].groupby([col_student, col_week]).size()
-            for (sid_raw, w), v in g.items():
-                sid = _sid(sid_raw)
-                ps_weeks_att.setdefault(sid, {})[str(w)] = int(v)
-
-        # risk by module (max)
-        if col_risk and col_module:
-            # rank risks
-            def _rank(s):
-                s = str(s).lower()
-                if "high" in s or "red" in s: return 3
-                if "med" in s or "amber" in s or "yellow" in s: return 2
-                if "low" in s or "green" in s: return 1
-                return 0
-            df["_risk_rank"] = df[col_risk].map(_rank)
-            g = df.groupby([col_student, col_module])["_risk_rank"].max()
-            for (sid_raw, mod), r in g.items():
-                sid = _sid(sid_raw)
-                lab = {3:"High",2:"Moderate",1:"Low",0:"Unknown"}[int(r)]
-                ps_risk_module_max.setdefault(sid, {})[str(mod)] = lab
-
-        # week x risk per student (counts)
-        if col_week and col_risk:
-            g = df.groupby([col_student, col_week, col_risk]).size()
-            for (sid_raw, w, rk), v in g.items():
-                sid = _sid(sid_raw)
-                ps_week_risk_counts.setdefault(sid, {}).setdefault(str(w), {})[str(rk)] = int(v)
-
-        # ---------- NEW: capacity + per-student per-module rates ----------
-        if att_mask is not None and col_module and col_week and col_student:
-            # absences per student per (module, week)
-            by_smw = df[att_mask].groupby([col_student, col_module, col_week]).size()
-
-            # module-week capacity = max absences any student recorded in that (module, week)
-            max_per_mw = by_smw.groupby([col_module, col_week]).max()
-            for (mod, w), v in max_per_mw.items():
-                module_week_capacity.setdefault(str(mod), {})[str(w)] = int(v)
-
-            # store per-student week detail (for heatmap)
-            for (sid_raw, mod, w), v in by_smw.items():
-                sid = _sid(sid_raw)
-                ps_week_module_att.setdefault(sid, {}).setdefault(str(mod), {})[str(w)] = int(v)
-
-            # per-student module totals + % using capacity
-            for sid in pd.unique(df[col_student].dropna().apply(_sid)):
-                rows = []
-                # all modules this student has non-attendance in
-                mods_for_sid = sorted(ps_week_module_att.get(sid, {}).keys())
-                for mod in mods_for_sid:
-                    wk_map = ps_week_module_att[sid][mod]     # week -> absent count
-                    total_abs = int(sum(wk_map.values()))
-                    # denominator: sum of capacity for this module over all known weeks
-                    caps = module_week_capacity.get(mod, {})
-                    denom = sum(int(caps.get(w, 0)) for w in weeks)  # keep week order consistent
-                    rate = round((total_abs / denom) * 100, 1) if denom else 0.0
-                    rows.append({"module": mod, "total_absences": total_abs, "rate": rate})
-                student_module_summary[sid] = rows
-
-    # ---- build “top students” (absences + per-module rate best) ----
-    # For the global list we aggregate absences across all modules and compute
-    # a rate weighted by the module capacities.
-    global_top_students_att = []
-    module_top_students_att = {}  # mod -> [{id,label,count,rate,qual}]
-    if student_enabled:
-        # convenient maps
-        sid_to_label = {s["id"]: s["label"] for s in student_lookup}
-        sid_to_qual  = {s["id"]: s["qual"]  for s in student_lookup}
-
-        # global totals
-        for sid, mcounts in ps_modules_att.items():
-            count = int(sum(mcounts.values()))
-            # rate denominator: sum of capacities of all modules this student has records for
-            denom = 0
-            for mod in mcounts.keys():
-                denom += sum(module_week_capacity.get(mod, {}).get(w, 0) for w in weeks)
-            rate = round((count / denom) * 100, 1) if denom else 0.0
-            global_top_students_att.append({
-                "id": sid, "label": sid_to_label.get(sid, sid),
-                "count": count, "rate": rate, "qual": sid_to_qual.get(sid, "")
-            })
-        # sort by absences desc
-        global_top_students_att.sort(key=lambda x: (-x["count"], -x["rate"]))
-
-        # per-module lists
-        if att_mask is not None and col_module:
-            g = df[att_mask].groupby([col_student, col_module]).size()
-            # build helper for per-student per-module rate
-            for mod in modules:
-                rows = []
-                caps = module_week_capacity.get(str(mod), {})
-                denom_mod = sum(caps.get(w, 0) for w in weeks)
-                # students with absences in this module
-                sub = g[g.index.get_level_values(1) == mod]
-                for (sid_raw, _), cnt in sub.items():
-                    sid = _sid(sid_raw)
-                    rate = round((int(cnt) / denom_mod) * 100, 1) if denom_mod else 0.0
-                    rows.append({
-                        "id": sid, "label": sid_to_label.get(sid, sid),
-                        "count": int(cnt), "rate": rate, "qual": sid_to_qual.get(sid, "")
-                    })
-                rows.sort(key=lambda x: (-x["count"], -x["rate"]))
-                if rows:
-                    module_top_students_att[str(mod)] = rows
-
-    # sample rows
-    sample_rows = df.head(50).fillna("").to_dict(orient="records")
-
-    # ---------------- HIGH RISK STUDENTS (DEDUPED) ----------------
-    high_risk_students = []
 
-    if col_student and col_risk:
-        # identify HIGH risk rows
-        high_mask = df[col_risk].astype(str).str.lower().str.contains("high", na=False)
-        df_high = df[high_mask].copy()
+def capacity_matrix(cube: pd.DataFrame) -> np.ndarray:
+    """Dense module x week (category codes) max absences any one student recorded there."""
+    has = set(cube.columns)
+    n_mod = len(cube["module"].cat.categories) if "module" in has else 0
+    n_week = len(cube["week"].cat.categories) if "week" in has else 0
+    cap = np.zeros((n_mod, n_week), dtype=np.int64)
+    if not {"att", "student", "module", "week"} <= has:
+        return cap
+    att = cube[cube["att"]]
+    by_smw = att.groupby(["student", "module", "week"], observed=True)["_n"].sum().reset_index()
+    np.maximum.at(cap, (by_smw["module"].cat.codes.to_numpy(), by_smw["week"].cat.codes.to_numpy()),
+                  by_smw["_n"].to_numpy())
+    return cap
+
+
+def cube_capacity(cube: pd.DataFrame) -> dict:
+    """module -> week -> max absences any one student recorded in that (module, week)."""
+    cap = capacity_matrix(cube)
+    if not cap.any():
+        return {}
+    mods = [str(m) for m in cube["module"].cat.categories]
+    weeks = [str(w) for w in cube["week"].cat.categories]
+    capacity = {}
+    for m, w in zip(*np.nonzero(cap)):
+        capacity.setdefault(mods[m], {})[weeks[w]] = int(cap[m, w])
+    return capacity
+
+
+def absence_matrix(cube: pd.DataFrame) -> np.ndarray:
+    """Dense student x module (category codes) non-attendance counts."""
+    n_stu = len(cube["student"].cat.categories)
+    n_mod = len(cube["module"].cat.categories)
+    att = cube[cube["att"] & cube["student"].notna() & cube["module"].notna()]
+    flat = att["student"].cat.codes.to_numpy().astype(np.int64) * n_mod + att["module"].cat.codes.to_numpy()
+    counts = np.bincount(flat, weights=att["_n"].to_numpy(), minlength=n_stu * n_mod)
+    return counts.astype(np.int64).reshape(n_stu, n_mod)
+
+
+# ---------------- top students ----------------
+# Each top list keeps the best N by absences and the best N by rate (the UI
+# can rank by either), ordered by absences. N is build_report's top_n,
+# TOP_STUDENTS_N unless given.
+# The UI filters a list by qualification and rate band before taking its top
+# N, so the cut is made within every (qualification, band) group: the top N of
+# any union of groups is always among the groups' own top N.
+TOP_STUDENTS_N = int(os.environ.get("TOP_STUDENTS_N", 50))
+
+
+def rate_bands(rates: np.ndarray) -> np.ndarray:
+    """The UI's rate band per rate: 0 low (<= 39), 1 moderate (40-69), 2 high (>= 70), 3 none of them."""
+    return np.select([rates <= 39, (rates >= 40) & (rates <= 69), rates >= 70], [0, 1, 2], 3)
+
+
+def _top_k(primary: np.ndarray, secondary: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k largest by (primary, secondary, earliest position), via partial selection."""
+    cand = np.arange(len(primary))
+    if len(primary) > k:
+        kth = np.partition(primary, len(primary) - k)[len(primary) - k]
+        cand = np.flatnonzero(primary >= kth)  # ties at the cut stay in play
+    order = np.lexsort((cand, -secondary[cand], -primary[cand]))
+    return cand[order[:k]]
+
+
+def top_students(counts: np.ndarray, rates: np.ndarray, k: int, groups: np.ndarray = None) -> np.ndarray:
+    """Positions of the top k by absences and top k by rate (within each group, if given),
+    ordered by (count desc, rate desc)."""
+    parts = []
+    for pos in ([np.arange(len(counts))] if groups is None else pd.Series(groups).groupby(groups).indices.values()):
+        pos = np.asarray(pos)
+        parts += [pos[_top_k(counts[pos], rates[pos], k)], pos[_top_k(rates[pos], counts[pos], k)]]
+    keep = np.unique(np.concatenate(parts)) if parts else np.array([], dtype=np.intp)
+    return keep[np.lexsort((keep, -rates[keep], -counts[keep]))]
+
+
+class StudentIndex:
+    """A report's count cube sorted by student, for one student's drill-down on request.
+
+    Each normalized _sid maps to a contiguous slice of code arrays; a view is
+    a few plain-Python sums over that slice (a student has tens of cube rows).
+    """
+
+    def __init__(self, cube: pd.DataFrame):
+        has = set(cube.columns)
+        cube = cube[cube["student"].notna()] if "student" in has else cube.iloc[:0]
+        codes = cube["student"].cat.codes.to_numpy() if "student" in has else np.array([], dtype=np.int8)
+        sort_keys = [cube[r].cat.codes.to_numpy() for r in ("risk", "week", "module") if r in has]
+        order = np.lexsort(sort_keys + [codes])
+        students = list(cube["student"].cat.categories) if "student" in has else []
+        bounds = np.searchsorted(codes[order], np.arange(len(students) + 1))
+        self.bounds = {sid: (int(bounds[i]), int(bounds[i + 1]))
+                       for i, sid in enumerate(students) if bounds[i] < bounds[i + 1]}
+
+        # role -> (codes in index order, labels); code -1 is missing
+        self.cols = {
+            role: (cube[role].cat.codes.to_numpy()[order], [str(c) for c in cube[role].cat.categories])
+            for role in ("module", "week", "risk") if role in has
+        }
+        self.att = cube["att"].to_numpy()[order] if "att" in has else None
+        self.n = cube["_n"].to_numpy()[order]
+        if "risk" in has:
+            ranks = np.array([_risk_rank(c) for c in cube["risk"].cat.categories] + [_risk_rank(np.nan)])
+            self.risk_rank = ranks[self.cols["risk"][0]]
+        self.capacity = cube_capacity(cube)
+
+    def __contains__(self, sid) -> bool:
+        return sid in self.bounds
+
+    def attach_lookup(self, student_lookup: list):
+        """Index the report's student_lookup for search(): sorted ids plus lower-cased labels."""
+        self.lookup = [{"id": s["id"], "label": s["label"], "qual": s["qual"]} for s in student_lookup]
+        by_id = sorted((str(s["id"]), i) for i, s in enumerate(self.lookup))
+        self.sorted_ids = [k for k, _ in by_id]
+        self.sorted_pos = [i for _, i in by_id]
+        self.labels = [s["label"].lower() for s in self.lookup]
+
+    def search(self, q: str, k: int = 10) -> list:
+        """Top-k students: student-number prefix matches first, then label (name) substring matches."""
+        q = (q or "").strip()
+        if not q or k <= 0:
+            return []
+        hits = []
+        i = bisect.bisect_left(self.sorted_ids, q)
+        while i < len(self.sorted_ids) and len(hits) < k and self.sorted_ids[i].startswith(q):
+            hits.append(self.sorted_pos[i])
+            i += 1
+        if len(hits) < k:
+            seen = set(hits)
+            ql = q.lower()
+            for pos, label in enumerate(self.labels):
+                if ql in label and pos not in seen:
+                    hits.append(pos)
+                    if len(hits) == k:
+                        break
+        return [self.lookup[pos] for pos in hits]
+
+    def view(self, sid: str) -> dict:
+        """The per-student maps the dashboard used to read from ps_* / student_module_summary."""
+        lo, hi = self.bounds[sid]
+        col = {role: codes[lo:hi].tolist() for role, (codes, _) in self.cols.items()}
+        label = {role: labels for role, (_, labels) in self.cols.items()}
+        n = self.n[lo:hi].tolist()
+        att = self.att[lo:hi].tolist() if self.att is not None else [False] * len(n)
+        mods, wks, rks = col.get("module"), col.get("week"), col.get("risk")
+
+        def decode(counts: dict, role: str) -> dict:
+            return {label[role][k]: v for k, v in sorted(counts.items())}
+
+        modules_att, weeks_att, risk_max, week_risk, week_module_att = {}, {}, {}, {}, {}
+        for i, w in enumerate(n):
+            m = mods[i] if mods else -1
+            wk = wks[i] if wks else -1
+            if att[i]:
+                if m >= 0:
+                    modules_att[m] = modules_att.get(m, 0) + w
+                if wk >= 0:
+                    weeks_att[wk] = weeks_att.get(wk, 0) + w
+                if m >= 0 and wk >= 0:
+                    per_week = week_module_att.setdefault(m, {})
+                    per_week[wk] = per_week.get(wk, 0) + w
+            if rks is not None:
+                if m >= 0:
+                    risk_max[m] = max(risk_max.get(m, 0), int(self.risk_rank[lo + i]))
+                if wk >= 0 and rks[i] >= 0:
+                    per_risk = week_risk.setdefault(wk, {})
+                    per_risk[rks[i]] = per_risk.get(rks[i], 0) + w
+
+        ps_week_module_att = {label["module"][m]: decode(wmap, "week") for m, wmap in sorted(week_module_att.items())}
+        summary = []
+        for mod in sorted(ps_week_module_att):
+            total_abs = int(sum(ps_week_module_att[mod].values()))
+            denom = sum(self.capacity.get(mod, {}).values())
+            rate = round((total_abs / denom) * 100, 1) if denom else 0.0
+            summary.append({"module": mod, "total_absences": total_abs, "rate": rate})
+
+        return {
+            "id": sid,
+            "ps_modules_att": decode(modules_att, "module") if modules_att else {},
+            "ps_weeks_att": decode(weeks_att, "week") if weeks_att else {},
+            "ps_risk_module_max": {label["module"][m]: {3: "High", 2: "Moderate", 1: "Low", 0: "Unknown"}[r]
+                                   for m, r in sorted(risk_max.items())},
+            "ps_week_risk_counts": {label["week"][wk]: decode(rmap, "risk") for wk, rmap in sorted(week_risk.items())},
+            "ps_week_module_att": ps_week_module_att,
+            "student_module_summary": summary,
+        }
+
 
+class FilterIndex:
+    """A report's count cube partitioned by (qualification, week).
+
+    Built once per upload; a dashboard filter change picks the matching
+    partitions, concatenates them and aggregates that slice with cube_metrics.
+    """
+
+    def __init__(self, cube: pd.DataFrame):
+        self.cube = cube.reset_index(drop=True)
+        keys = ["qual", "week"] if "week" in self.cube.columns else ["qual"]
+        parts = self.cube.groupby(keys, observed=True, dropna=False, sort=False).indices
+        self.parts = {(k if isinstance(k, tuple) else (k, None)): v for k, v in parts.items()}
+
+    def aggregates(self, weeks=None, quals=None) -> dict:
+        """cube_metrics over the selected weeks / qualifications (empty or None means all)."""
+        weeks = {str(w) for w in weeks or []}
+        quals = {str(q) for q in quals or []}
+        picked = [
+            rows for (q, w), rows in self.parts.items()
+            if (not quals or str(q) in quals) and (not weeks or (not pd.isna(w) and str(w) in weeks))
+        ]
+        rows = np.sort(np.concatenate(picked)) if picked else np.array([], dtype=np.intp)
+        out = cube_metrics(self.cube.take(rows))
+        out["weeks"] = sorted(weeks)
+        out["qualifications"] = sorted(quals)
+        return out
+
+
+# ---------------- section execution ----------------
+# build_report's sections are independent once the cube exists. Serial is the
+# default; REPORT_PARALLEL=1 (or build_report(parallel=True)) runs them on a
+# thread pool instead. Threads share the cube and the accumulated tables
+# without copying, and most of the heavy pandas / numpy work releases the GIL.
+REPORT_PARALLEL = os.environ.get("REPORT_PARALLEL", "0") == "1"
+REPORT_THREADS = int(os.environ.get("REPORT_THREADS", 4))
+
+
+def _run_sections(sections: list, parallel: bool) -> dict:
+    """Run the section callables and merge their dicts (in list order either way)."""
+    def run(fn):
+        with timed(fn.__name__.removesuffix("_section")):
+            return fn()
+    if parallel and len(sections) > 1:
+        with ThreadPoolExecutor(max_workers=min(REPORT_THREADS, len(sections))) as pool:
+            # each worker runs in a copy of this context so its phases land in the same log
+            parts = [f.result() for f in [pool.submit(contextvars.copy_context().run, run, fn) for fn in sections]]
+    else:
+        parts = [run(fn) for fn in sections]
+    merged = {}
+    for part in parts:
+        merged.update(part)
+    return merged
+
+
+def _frame_tables(df: pd.DataFrame, cols: dict) -> dict:
+    """One cleaned frame's share of a report: its count cube plus the few per-value
+    and per-student tables the report reads besides it. Encodes df in place."""
+    col_student = cols["student"]
+    col_name    = cols["name"]
+    col_module  = cols["module"]
+    col_week    = cols["week"]
+    col_reason  = cols["reason"]
+    col_risk    = cols["risk"]
+    col_resolved= cols["resolved"]
+    col_interv  = cols["interv"]
+    col_year    = cols["year"]
+
+    df["_n"] = 1
+    raw_ids = {}
+    if col_student:
+        # raw spelling -> _sid, in order of appearance (the final student order sorts these)
+        raw_ids = {u: _sid(u) for u in pd.unique(df[col_student].dropna())}
+    if col_week:
+        df[col_week] = df[col_week].astype(str)
+    encode_frame(df, cols)
+
+    # Total records: Student Number present OR (Student Name & Module(s) & Week present)
+    has_sn = _nonempty(df[col_student]) if col_student else pd.Series(False, index=df.index)
+    has_triplet = (
+        (_nonempty(df[col_name]) if col_name else False) &
+        (_nonempty(df[col_module]) if col_module else False) &
+        (_nonempty(df[col_week]) if col_week else False)
+    )
+    total_records = int(df["_n"][has_sn | has_triplet].sum())
+
+    # reason flags (attendance, _006 / _007 codes)
+    reason_flags = reason_classifier.flags(df[col_reason]) if col_reason else None
+    att_mask = reason_flags["attendance"] if reason_flags is not None else None
+
+    # resolved flag: Intervention non-empty, else a truthy Resolved value
+    truthy = None
+    if col_interv:
+        truthy = _nonempty(df[col_interv])
+    elif col_resolved:
+        vals = df[col_resolved].astype(str).str.strip().str.lower()
+        truthy = vals.isin({"yes", "y", "true", "1", "resolved"})
+
+    def sums(col: str, dropna: bool = True) -> dict:
+        # value -> row count, in order of appearance (missing under None)
+        counts = df.groupby(col, dropna=dropna, sort=False, observed=True)["_n"].sum()
+        return {(None if pd.isna(k) else k): int(v) for k, v in counts.items()}
+
+    names = {}
+    if col_student and col_name:
+        pairs = pd.DataFrame({"s": df[col_student], "n": df[col_name]}).dropna()
+        for (sid, nm), c in pairs.assign(n=pairs["n"].astype(str)).groupby(["s", "n"], observed=True, sort=False).size().items():
+            names.setdefault(sid, {})[nm] = int(c)
+
+    # HIGH risk students: first name / year / programme, module sets and reason flags
+    high = {}
+    if col_student and col_risk:
+        high_rows = _cat_mask(df[col_risk], lambda c: c.str.lower().str.contains("high", na=False)) & df[col_student].notna()
+        df_high = df[high_rows]
         if not df_high.empty:
-            grouped = df_high.groupby(col_student)
+            grouped = df_high.groupby(col_student, observed=True, sort=False)
+            for sid in grouped.size().index:
+                high[sid] = {"name": None, "year": None, "qual": None, "modules": set(), "canvas": False,
+                             "canvas_modules": set(), "poor": False, "non": False}
+            firsts = {"qual": grouped["_qual"].first()}
+            if col_name:
+                firsts["name"] = _first_str(grouped[col_name])
+            if col_year:
+                firsts["year"] = _first_str(grouped[col_year])
+            for field, values in firsts.items():
+                for sid, v in values.items():
+                    high[sid][field] = v
+
+            def add_modules(rows, field):
+                pairs = pd.DataFrame({"k": rows[col_student], "v": rows[col_module]}).dropna()
+                for sid, m in pairs.assign(v=pairs["v"].astype(str)).drop_duplicates().itertuples(index=False):
+                    high[sid][field].add(m)
+
+            if col_module:
+                add_modules(df_high, "modules")
+            if col_reason:
+                flags = reason_flags[high_rows][["canvas_007", "non_participation_006", "poor_participation_006"]]
+                seen = flags.groupby(df_high[col_student], observed=True).any()
+                for sid, canvas, non, poor in seen.itertuples():
+                    high[sid].update(canvas=bool(canvas), non=bool(non), poor=bool(poor))
+                if col_module:
+                    add_modules(df_high[flags["canvas_007"]], "canvas_modules")
 
-            for sid_raw, g in grouped:
-                sid = _sid(sid_raw)
+    return {
+        "cube": build_cube(df, cols, att_mask, truthy),
+        "total_records": total_records,
+        "raw_ids": raw_ids,
+        "names": names,
+        "reasons": sums(col_reason) if col_reason else {},
+        "resolved": sums(col_resolved, dropna=False) if col_resolved and not col_interv else {},
+        "high": high,
+    }
 
-                name = ""
-                if col_name and col_name in g.columns:
-                    name = g[col_name].dropna().astype(str).iloc[0] if not g[col_name].dropna().empty else ""
 
-                year_registered = ""
-                if "Year Registered" in g.columns:
-                    year_registered = g["Year Registered"].dropna().astype(str).iloc[0] if not g["Year Registered"].dropna().empty else ""
+def _ordered_counts(counts: dict) -> pd.Series:
+    """value -> count as a Series sorted by count, ties in order of appearance (like _wcounts)."""
+    return pd.Series(list(counts.values()), index=pd.Index(list(counts), dtype=object),
+                     dtype=np.int64).sort_values(ascending=False, kind="stable")
 
-                programme = g["_qual"].iloc[0] if "_qual" in g.columns else ""
 
-                modules = sorted(g[col_module].dropna().astype(str).unique().tolist()) if col_module else []
-                modules_str = ", ".join(modules)
-                
-                # ---------------- Engagement Risk ----------------
+def _sorted_labels(labels: list) -> list:
+    """Labels in the order a categorical would give them: sorted, else as first seen."""
+    try:
+        return sorted(labels)
+    except TypeError:  # numbers mixed with text don't sort
+        return list(labels)
+
+
+class ReportAccumulator:
+    """Folds cleaned row chunks into everything a report is built from.
+
+    Each chunk becomes its count cube, with every role stored as an int code
+    into one label table per role, plus small per-value and per-student tables
+    (reason counts, name counts, HIGH risk students). Chunk cubes are merged
+    by summing "_n" over identical code rows, so memory follows the number of
+    distinct student / module / week / risk combinations, not the row count.
+    build_report is one chunk through the same path.
+    """
+
+    SAMPLE_SIZE = 50
+
+    def __init__(self):
+        self.cols = None
+        self.cleaning_stats = None
+        self.sample = None
+        self.total_records = 0
+        self.labels = {}      # role -> {label: code}, codes in order of appearance
+        self.raw_ids = {}     # raw student value -> _sid
+        self.names = {}       # _sid -> {name: rows}
+        self.reasons = {}     # reason text -> rows
+        self.resolved = {}    # Resolved value -> rows (without an Intervention column)
+        self.high = {}        # _sid -> HIGH risk fields
+        self._cube = None
+        self._parts = []
+        self._pending = 0
+
+    def add(self, chunk: pd.DataFrame, cleaning_stats: dict = None):
+        """Fold in a chunk of sheet rows; cleaning_stats marks it as already cleaned."""
+        if cleaning_stats is None:
+            chunk, cleaning_stats = clean_dataframe(chunk)
+        if self.cleaning_stats is None:
+            self.cleaning_stats = dict(cleaning_stats)
+        else:
+            self.cleaning_stats = {k: self.cleaning_stats[k] + v for k, v in cleaning_stats.items()}
+
+        # shallow: columns added / replaced below never write through to the caller's frame
+        df = chunk.copy(deep=False)
+        df.columns = [str(c).strip() for c in df.columns]
+        taken = 0 if self.sample is None else len(self.sample)
+        if taken < self.SAMPLE_SIZE:
+            head = df.head(self.SAMPLE_SIZE - taken)
+            self.sample = head if self.sample is None else pd.concat([self.sample, head])
+        if self.cols is None:
+            self.cols = _report_columns(df.columns)
+
+        tables = _frame_tables(df, self.cols)
+        self.total_records += tables["total_records"]
+        for raw, sid in tables["raw_ids"].items():
+            self.raw_ids.setdefault(raw, sid)
+        for sid, counts in tables["names"].items():
+            mine = self.names.setdefault(sid, {})
+            for nm, c in counts.items():
+                mine[nm] = mine.get(nm, 0) + c
+        for mine, counts in ((self.reasons, tables["reasons"]), (self.resolved, tables["resolved"])):
+            for value, c in counts.items():
+                mine[value] = mine.get(value, 0) + c
+        for sid, entry in tables["high"].items():
+            mine = self.high.setdefault(sid, entry)
+            if mine is not entry:
+                for field in ("name", "year", "qual"):
+                    if mine[field] is None:
+                        mine[field] = entry[field]
+                mine["modules"] |= entry["modules"]
+                mine["canvas_modules"] |= entry["canvas_modules"]
+                for flag in ("canvas", "poor", "non"):
+                    mine[flag] = mine[flag] or entry[flag]
+
+        self._parts.append(self._codes(tables["cube"]))
+        self._pending += len(self._parts[-1])
+        # fold once the pending parts outgrow the running total, so each cube
+        # row is re-grouped only a bounded number of times
+        if self._cube is None or self._pending >= len(self._cube):
+            self._fold()
+
+    def _codes(self, cube: pd.DataFrame) -> pd.DataFrame:
+        """A chunk cube with each categorical role swapped for codes into self.labels (-1 missing)."""
+        out = {}
+        for role in cube.columns:
+            col = cube[role]
+            if not isinstance(col.dtype, pd.CategoricalDtype):
+                out[role] = col.to_numpy()  # att / resolved flags and "_n"
+                continue
+            table = self.labels.setdefault(role, {})
+            for label in col.dropna().unique():
+                table.setdefault(label, len(table))
+            lookup = np.array([table.get(c, -1) for c in col.cat.categories] + [-1], dtype=np.int32)
+            out[role] = lookup[col.cat.codes.to_numpy()]
+        return pd.DataFrame(out)
+
+    def _fold(self):
+        frames = ([self._cube] if self._cube is not None else []) + self._parts
+        if frames:
+            merged = pd.concat(frames, ignore_index=True)
+            keys = [c for c in merged.columns if c != "_n"]
+            self._cube = merged.groupby(keys, sort=False)["_n"].sum().reset_index()
+        self._parts = []
+        self._pending = 0
+
+    def cube(self) -> pd.DataFrame:
+        """The merged count cube, with categoricals ordered as build_cube would order them."""
+        self._fold()
+        out = {}
+        for role in self._cube.columns:
+            codes = self._cube[role].to_numpy()
+            if role not in self.labels:
+                out[role] = codes
+                continue
+            labels = list(self.labels[role])
+            if role == "student":
+                raws = _sorted_labels(list(self.raw_ids))
+                order = list(dict.fromkeys(self.raw_ids[raw] for raw in raws))
+                categories = pd.Index(order, dtype=object)
+            else:
+                order = _sorted_labels(labels)
+                categories = pd.Index(order, dtype=object) if role == "qual" else pd.Index(order)
+            pos = {label: i for i, label in enumerate(order)}
+            remap = np.array([pos[label] for label in labels] + [-1], dtype=np.int32)
+            out[role] = pd.Categorical.from_codes(remap[codes], categories=categories)
+        return pd.DataFrame(out)
+
+    def report(self, sample: pd.DataFrame = None, on_cube=None, parallel: bool = None, top_n: int = None) -> dict:
+        """The dashboard report of every row added so far (sample: preview rows to show instead)."""
+        if self.cols is None:
+            self.add(pd.DataFrame())
+        sample = self.sample if sample is None else sample
+        top_n = TOP_STUDENTS_N if top_n is None else top_n
+
+        cols = self.cols
+        col_student = cols["student"]
+        col_module  = cols["module"]
+        col_week    = cols["week"]
+        col_reason  = cols["reason"]
+        col_risk    = cols["risk"]
+        col_resolved= cols["resolved"]
+        col_interv  = cols["interv"]
+        col_qual    = cols["qual"]
+
+        # every per-module / per-week / per-student count below comes from the cube
+        with timed("cube"):
+            cube = self.cube()
+        if on_cube is not None:
+            on_cube(cube)  # e.g. to keep a FilterIndex without a second pass
+
+        modules = sorted({str(m) for m in cube["module"].cat.categories}) if col_module else []
+        student_enabled = bool(col_student)
+        has_att = "att" in cube.columns
+
+        # The sections below only read the cube and the accumulated tables, so
+        # they can run side by side on threads (parallel=True); each returns its keys.
+        def globals_section():
+            risk_counts     = _counts(_wcounts(cube, "risk", dropna=False)) if col_risk else {}
+            # Resolved status via Intervention non-empty
+            if col_interv:
+                yes = int(cube["_n"][cube["resolved"]].sum())
+                no = int(cube["_n"].sum() - yes)
+                resolved = {"Yes": yes, "No": no}
+                resolved_counts = resolved
+            else:
+                resolved_counts = _counts(_ordered_counts(self.resolved)) if col_resolved else {}
+            by_reason       = _counts(_ordered_counts(self.reasons).head(15)) if col_reason else {}
+
+            weeks   = _sort_weeks_like(cube["week"].cat.categories) if col_week else []
+            quals   = sorted(cube["qual"].cat.categories)
+            return {"risk_counts": risk_counts, "resolved_counts": resolved_counts, "by_reason": by_reason,
+                    "weeks": weeks, "qualifications": quals}
+
+        # ----- student analytics -----
+        # Per-student drill-down maps are no longer built here: StudentIndex
+        # (see on_cube) answers /student/<id> from the cube on request.
+        def students_section():
+            student_lookup = []
+            module_week_capacity = cube_capacity(cube)   # module -> week -> max sessions (derived)
+
+            # build name + qualification maps
+            if student_enabled:
+                # names: most frequent per student, ties -> smallest (like Series.mode)
+                name_map = {sid: min(counts, key=lambda nm: (-counts[nm], nm)) for sid, counts in self.names.items()}
+
+                # quals
+                tmp = cube.loc[cube["student"].notna(), ["student", "qual", "_n"]].rename(columns={"student": "_sid"})
+                qual_map = _wmode(tmp, "qual", "Unknown")
+
+                # student lookup
+                for sid in self.labels["student"]:
+                    nm = (name_map.get(sid, "") or "").strip()
+                    ql = (qual_map.get(sid, "") or "").strip()
+                    label = f"{sid} — {nm}" if nm else sid
+                    display = f"{label} — [{ql}]" if ql else label
+                    student_lookup.append({"id": sid, "label": display, "name": nm, "qual": ql})
+
+            # ---- build “top students” (absences + per-module rate best) ----
+            # For the global list we aggregate absences across all modules and compute
+            # a rate weighted by the module capacities.
+            global_top_students_att = []
+            module_top_students_att = {}  # mod -> [{id,label,count,rate,qual}]
+            if student_enabled and has_att and col_module:
+                # convenient maps
+                sid_to_label = {s["id"]: s["label"] for s in student_lookup}
+                sid_to_qual  = {s["id"]: s["qual"]  for s in student_lookup}
+                sids = cube["student"].cat.categories
+                qual_codes, _ = pd.factorize(pd.Index([sid_to_qual.get(sid, "") for sid in sids], dtype=object))
+
+                counts = absence_matrix(cube)                    # student x module
+                cap_total = capacity_matrix(cube).sum(axis=1)    # module -> capacity summed over weeks
+
+                def ranked(pos, cnt, denom):
+                    rates = np.array([round((c / d) * 100, 1) if d else 0.0 for c, d in zip(cnt.tolist(), denom.tolist())])
+                    groups = qual_codes[pos] * 4 + rate_bands(rates)   # the UI's qualification x band filters
+                    return [{
+                        "id": sids[pos[i]], "label": sid_to_label.get(sids[pos[i]], sids[pos[i]]),
+                        "count": int(cnt[i]), "rate": float(rates[i]), "qual": sid_to_qual.get(sids[pos[i]], "")
+                    } for i in top_students(cnt, rates, top_n, groups)]
+
+                # global totals; rate denominator: capacities of all modules the student has absences in
+                total = counts.sum(axis=1)
+                pos = np.flatnonzero(total)
+                global_top_students_att = ranked(pos, total[pos], (counts[pos] > 0).astype(np.int64) @ cap_total)
+
+                # per-module lists
+                code_of = {str(m): i for i, m in enumerate(cube["module"].cat.categories)}
+                for mod in modules:
+                    m = code_of.get(str(mod))
+                    if m is None:
+                        continue
+                    pos = np.flatnonzero(counts[:, m])
+                    if pos.size:
+                        module_top_students_att[str(mod)] = ranked(pos, counts[pos, m], np.full(pos.size, cap_total[m]))
+
+            return {"student_lookup": student_lookup, "module_week_capacity": module_week_capacity,
+                    "global_top_students_att": global_top_students_att, "module_top_students_att": module_top_students_att}
+
+        def sample_section():
+            # sample rows: raw (un-encoded) leading rows with the same derived columns
+            rows = sample.head(50).copy()
+            rows.columns = [str(c).strip() for c in rows.columns]
+            if col_week:
+                rows[col_week] = rows[col_week].astype(str)
+            rows["_qual"] = rows[col_qual].map(_canon_qual) if col_qual else "Unknown"
+            if col_student and col_risk and col_module:
+                rows["_risk_rank"] = rows[col_risk].map(_risk_rank)
+            sample_rows = rows.fillna("").to_dict(orient="records")
+            return {"sample_rows": sample_rows}
+
+        def high_risk_section():
+            # ---------------- HIGH RISK STUDENTS (DEDUPED) ----------------
+            high_risk_students = []
+            order = {sid: i for i, sid in enumerate(cube["student"].cat.categories)} if col_student else {}
+            for sid in sorted(self.high, key=order.__getitem__):
+                entry = self.high[sid]
+
+                # ---------------- Engagement / Assessment Risk ----------------
                 engagement_risk = ""
-
-                if col_reason and col_module:
-                    engagement_rows = g[
-                        g[col_reason].astype(str).str.contains(
-                            "Canvas Activity_007",
-                            case=False,
-                            na=False
-                        )
-                    ]
-
-                    if not engagement_rows.empty:
-                        engagement_modules = sorted(
-                            engagement_rows[col_module]
-                            .dropna()
-                            .astype(str)
-                            .unique()
-                            .tolist()
-                        )
-
-                        engagement_risk = f"HIGH({','.join(engagement_modules)})"
-                        
-                # ---------------- Assessment Risk ----------------
                 assessment_risk = ""
-
                 if col_reason:
-                    if g[col_reason].astype(str).str.contains(
-                        "Non-Participation in Formal Assessment_006",
-                        case=False,
-                        na=False
-                    ).any():
-
+                    if col_module and entry["canvas"]:
+                        engagement_risk = "HIGH(" + ",".join(sorted(entry["canvas_modules"])) + ")"
+                    if entry["non"]:
                         assessment_risk = "HIGH(Non-Participation in Formal Assessment_006)"
-
-                    elif g[col_reason].astype(str).str.contains(
-                        "Poor Participation in Formal Assessment_006",
-                        case=False,
-                        na=False
-                    ).any():
-
+                    elif entry["poor"]:
                         assessment_risk = "HIGH(Poor Participation in Formal Assessment_006)"
 
                 high_risk_students.append({
                     "student_number": sid,
-                    "name": name,
-                    "year_registered": year_registered,
-                    "programme": programme,
-                    "modules": modules_str,
+                    "name": entry["name"] or "",
+                    "year_registered": entry["year"] or "",
+                    "programme": entry["qual"],
+                    "modules": ", ".join(sorted(entry["modules"])),
                     "engagement_risk": engagement_risk,
                     "absenteeism_risk": "High",
                     "assessment_risk": assessment_risk,
@@ -595,44 +1395,1348 @@ def build_report(df: pd.DataFrame) -> dict:
                     "campus_decision": "",
                     "notes": ""
                 })
+            return {"high_risk_students": high_risk_students}
+
+        def metrics_section():
+            return cube_metrics(cube)
+
+        r = _run_sections([globals_section, metrics_section, students_section, sample_section, high_risk_section],
+                          REPORT_PARALLEL if parallel is None else parallel)
+
+        return {
+            "cleaning_stats": self.cleaning_stats,
+            "total_records": self.total_records,
+            "unique_students": len(self.labels.get("student", {})) if col_student else 0,
+            "risk_counts": r["risk_counts"],
+            "resolved_counts": r["resolved_counts"],
+            "by_reason": r["by_reason"],
+            "weeks": r["weeks"],
+            "modules": modules,
+            "qualifications": r["qualifications"],
+            "by_module": r["by_module"],
+            "by_module_attendance": r["by_module_attendance"],
+            "by_module_abs_total": r["by_module_abs_total"],
+            "by_week_attendance": r["by_week_attendance"],
+            "by_week_module_all": r["by_week_module_all"],
+            "by_week_module_attendance": r["by_week_module_attendance"],
+            "week_risk": r["week_risk"],
+            "resolved_rate": r["resolved_rate"],
+
+            # student analytics (per-student drill-down: /student/<id>)
+            "student_enabled": student_enabled,
+            "student_lookup": r["student_lookup"],
+            "module_week_capacity": r["module_week_capacity"],  # heatmap rates
+
+            # top lists
+            "global_top_students_att": r["global_top_students_att"],
+            "module_top_students_att": r["module_top_students_att"],
+
+            "sample_rows": r["sample_rows"],
+            "high_risk_students": r["high_risk_students"],
+        }
 
-    return {
-        "cleaning_stats": cleaning_stats,
-        "total_records": total_records,
-        "unique_students": unique_students,
-        "risk_counts": risk_counts,
-        "resolved_counts": resolved_counts,
-        "by_reason": by_reason,
-        "weeks": weeks,
-        "modules": modules,
-        "qualifications": quals,
-        "by_module": by_module,
-        "by_module_attendance": by_module_att,
-        "by_module_abs_total": by_module_abs_total,
-        "by_week_attendance": by_week_att,
-        "by_week_module_all": by_week_module_all,
-        "by_week_module_attendance": by_week_module_att,
-        "week_risk": week_risk,
-        "resolved_rate": resolved_rate,
 
-        # student analytics
-        "student_enabled": student_enabled,
-        "student_lookup": student_lookup,
-        "ps_modules_att": ps_modules_att,
-        "ps_weeks_att": ps_weeks_att,
-        "ps_risk_module_max": ps_risk_module_max,
-        "ps_week_risk_counts": ps_week_risk_counts,
-        "ps_week_module_att": ps_week_module_att,           # for heatmap
-        "student_module_summary": student_module_summary,   # totals + per-module %
-        "module_week_capacity": module_week_capacity,       # debugging / future use
-
-        # top lists
-        "global_top_students_att": global_top_students_att,
-        "module_top_students_att": module_top_students_att,
-
-        "sample_rows": sample_rows,
-        "high_risk_students": high_risk_students,
-    }
+def build_report(df: pd.DataFrame, cleaning_stats: dict = None, sample: pd.DataFrame = None, on_cube=None,
+                 parallel: bool = None, top_n: int = None) -> dict:
+    # Clean first (callers passing cleaning_stats hand us an already-cleaned
+    # frame, e.g. one loaded from an upload snapshot). `sample` replaces the
+    # frame's first rows as the preview, e.g. read_preview's full-width rows.
+    if cleaning_stats is None:
+        with timed("clean"):
+            df, cleaning_stats = clean_dataframe(df)
+    acc = ReportAccumulator()
+    with timed("aggregate"):
+        acc.add(df, cleaning_stats)
+    return acc.report(sample=sample, on_cube=on_cube, parallel=parallel, top_n=top_n)
+
+
+# ---------------- streaming ingestion ----------------
+# Large workbooks are read with openpyxl's read-only row iterator, cleaned and
+# folded into a ReportAccumulator chunk by chunk, so neither the whole sheet
+# nor a full DataFrame is ever held in memory; the result is the same as
+# build_report over a full read. The cleaned chunks are appended to the
+# upload's snapshot on the way, so later rebuilds never re-read the workbook.
+STREAM_CHUNK_ROWS = int(os.environ.get("STREAM_CHUNK_ROWS", 5000))
+STREAM_MIN_BYTES = int(os.environ.get("STREAM_MIN_BYTES", 8 * 1024 * 1024))  # 0 = always stream .xlsx
+
+
+def _excel_header(values) -> list:
+    """Column names the way pd.read_excel builds them (Unnamed: i, X.1 for repeats)."""
+    names, seen = [], {}
+    for i, v in enumerate(values):
+        name = f"Unnamed: {i}" if v is None or (isinstance(v, str) and not v.strip()) else v
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _rows_to_frame(columns: list, rows: list, as_str: bool = False) -> pd.DataFrame:
+    if as_str:
+        # matches read_upload's dtype=str read
+        return pd.DataFrame([[None if v is None else str(v) for v in row] for row in rows], columns=columns, dtype=str)
+    # same parser read_excel uses, so numeric-looking text is typed the same way
+    return TextParser([columns] + rows, header=0).read()
+
+
+def _excel_rows(path: str, preview: list = None):
+    """Generator over the first sheet of an .xlsx: first (columns, as_str) for read_upload's
+    columns, then each non-blank row as a list of those columns' values. Nothing for an empty sheet.
+    A preview list gets the full header and the first PREVIEW_ROWS rows at full width, on the way."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, None) or [])
+        while header and header[-1] is None:
+            header.pop()
+        if not header:
+            return
+        columns = _excel_header(header)
+        width = len(columns)
+        used = upload_columns(columns)
+        keep = used or list(range(width))
+        if preview is not None:
+            preview.append(columns)
+        yield [columns[i] for i in keep], bool(used)
+
+        for row in rows:
+            row = list(row[:width])
+            if all(v is None for v in row):
+                continue  # read_excel skips blank lines as well
+            row += [None] * (width - len(row))
+            if preview is not None and len(preview) <= PREVIEW_ROWS:
+                preview.append([int(v) if isinstance(v, float) and v.is_integer() else v for v in row])
+            # read_excel hands back integral floats as ints
+            yield [int(v) if isinstance(v, float) and v.is_integer() else v for v in (row[i] for i in keep)]
+    finally:
+        wb.close()
+
+
+def _preview_frame(collected: list) -> pd.DataFrame:
+    """read_preview's frame from the rows _excel_rows collected (header first)."""
+    if not collected:
+        return pd.DataFrame()
+    preview, _ = clean_dataframe(_rows_to_frame(collected[0], collected[1:], as_str=True))
+    return preview
+
+
+def _row_frames(columns: list, rows, as_str: bool, chunk_rows: int):
+    """DataFrames of at most chunk_rows rows each from an iterable of row lists."""
+    buf = []
+    for row in rows:
+        buf.append(row)
+        if len(buf) >= chunk_rows:
+            yield _rows_to_frame(columns, buf, as_str)
+            buf = []
+    if buf:
+        yield _rows_to_frame(columns, buf, as_str)
+
+
+def iter_excel_chunks(path: str, chunk_rows: int = STREAM_CHUNK_ROWS, preview: list = None):
+    """Yield the first sheet of an .xlsx as DataFrames of at most chunk_rows rows (read_upload's columns)."""
+    rows = _excel_rows(path, preview)
+    columns, as_str = next(rows, (None, False))
+    if columns is not None:
+        yield from _row_frames(columns, rows, as_str, chunk_rows)
+
+
+def build_report_streaming(path: str, chunk_rows: int = STREAM_CHUNK_ROWS, on_cube=None, key: str = None) -> dict:
+    """build_report(read_upload(path)) in bounded memory; with a key, also the upload's snapshot."""
+    acc = ReportAccumulator()
+    collected = []
+    with timed("parse_stream"), SnapshotWriter(key) as snapshot:
+        for chunk in iter_excel_chunks(path, chunk_rows, collected):
+            clean, stats = clean_dataframe(chunk)
+            snapshot.write(clean)
+            acc.add(clean, stats)
+        preview = _preview_frame(collected)
+        snapshot.close(acc.cleaning_stats, preview)
+    return acc.report(sample=preview, on_cube=on_cube)
+
+
+def _should_stream(path: str) -> bool:
+    return (bool(path) and path.lower().endswith(".xlsx")
+            and os.path.getsize(path) >= STREAM_MIN_BYTES)
+
+
+# ---------------- report cache ----------------
+# build_report results keyed by a hash of the uploaded bytes. Reports are kept
+# pickled so the size bound is exact and callers can't mutate a cached entry.
+# Bump REPORT_CACHE_VERSION whenever the shape of build_report's output changes.
+REPORT_CACHE_VERSION = 8
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "soit_report_cache"))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get("REPORT_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+REPORT_CACHE_DISK_MAX_BYTES = int(os.environ.get("REPORT_CACHE_DISK_MAX_BYTES", 1024 * 1024 * 1024))
+
+
+def file_hash(path: str) -> str:
+    """Stable key for an uploaded workbook: SHA-256 of the file, read in blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _prune_dir(directory: str, max_bytes: int, max_age: float = None, keep_recent: float = 0):
+    """Delete least-recently-touched files until the directory fits max_bytes.
+
+    With max_age, anything untouched for longer (abandoned .tmp files too) goes
+    first. Files touched in the last keep_recent seconds are never deleted.
+    Dotfiles (lock files) are left alone.
+    """
+    now = time.time()
+    entries = []
+    total = 0
+    for entry in os.scandir(directory):
+        if entry.name.startswith(".") or not entry.is_file():
+            continue
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        if max_age is not None and now - st.st_mtime > max_age:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+            continue
+        if entry.name.endswith(".tmp"):
+            continue
+        entries.append((st.st_mtime, st.st_size, entry.path))
+        total += st.st_size
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= max_bytes or now - mtime < keep_recent:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+class ReportCache:
+    """Two-tier LRU cache: in-process memory in front of a shared disk directory."""
+
+    def __init__(self, directory: str, max_bytes: int, disk_max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self._mem = OrderedDict()   # key -> pickled report
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"v{REPORT_CACHE_VERSION}-{key}.pkl")
+
+    def _remember(self, key: str, blob: bytes):
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._mem_bytes -= len(old)
+            if len(blob) > self.max_bytes:
+                return
+            self._mem[key] = blob
+            self._mem_bytes += len(blob)
+            while self._mem_bytes > self.max_bytes:
+                _, evicted = self._mem.popitem(last=False)
+                self._mem_bytes -= len(evicted)
+
+    def get(self, key: str):
+        with self._lock:
+            blob = self._mem.get(key)
+            if blob is not None:
+                self._mem.move_to_end(key)
+        if blob is None:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as fh:
+                    blob = fh.read()
+                os.utime(path)  # mtime doubles as last-access for disk eviction
+            except OSError:
+                return None
+            self._remember(key, blob)
+        try:
+            return pickle.loads(blob)
+        except Exception:
+            self.discard(key)
+            return None
+
+    def put(self, key: str, report: dict):
+        blob = pickle.dumps(report, protocol=pickle.HIGHEST_PROTOCOL)
+        self._remember(key, blob)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # write-then-rename so other workers never read a half-written file
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(blob)
+            os.replace(tmp, self._path(key))
+            _prune_dir(self.directory, self.disk_max_bytes)
+        except OSError:
+            pass  # the disk tier is best-effort; memory still holds the entry
+
+    def discard(self, key: str):
+        with self._lock:
+            blob = self._mem.pop(key, None)
+            if blob is not None:
+                self._mem_bytes -= len(blob)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+
+report_cache = ReportCache(REPORT_CACHE_DIR, REPORT_CACHE_MAX_BYTES, REPORT_CACHE_DISK_MAX_BYTES)
+# FilterIndex per upload, same keys; lives in a subdirectory so pruning stays separate.
+# Each cache below has its own, smaller memory budget on top of report_cache's.
+FILTER_CACHE_MAX_BYTES = int(os.environ.get("FILTER_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+filter_cache = ReportCache(os.path.join(REPORT_CACHE_DIR, "filters"), FILTER_CACHE_MAX_BYTES, REPORT_CACHE_DISK_MAX_BYTES)
+# StudentIndex per upload. Drill-downs must not unpickle an index per request,
+# so the last few are also kept live in this process.
+STUDENT_CACHE_MAX_BYTES = int(os.environ.get("STUDENT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+student_cache = ReportCache(os.path.join(REPORT_CACHE_DIR, "students"), STUDENT_CACHE_MAX_BYTES, REPORT_CACHE_DISK_MAX_BYTES)
+STUDENT_INDEX_LIVE = int(os.environ.get("STUDENT_INDEX_LIVE", 8))
+_live_student_index = OrderedDict()
+_live_lock = threading.Lock()
+# gzipped JSON of report sections, keyed "<report id>-<section>"
+SECTION_CACHE_MAX_BYTES = int(os.environ.get("SECTION_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+section_cache = ReportCache(os.path.join(REPORT_CACHE_DIR, "sections"), SECTION_CACHE_MAX_BYTES, REPORT_CACHE_DISK_MAX_BYTES)
+
+# Every worker reads the caches above, so an upload only needs computing once.
+# compute_lock(key) makes that hold when two workers (or pool processes) want
+# the same missing key at once: the second waits, then finds the first one's
+# result. Each key gets its own flock file, which the holder deletes on the
+# way out (its result is cached by then); the kernel drops the lock if a
+# holder dies, and files such crashes leave behind are pruned later.
+try:
+    import fcntl
+except ImportError:  # no flock (Windows): compute locks only cover this process
+    fcntl = None
+
+COMPUTE_LOCK_DIR = os.path.join(REPORT_CACHE_DIR, "locks")
+COMPUTE_LOCK_TIMEOUT = float(os.environ.get("COMPUTE_LOCK_TIMEOUT", 300))
+_local_compute_locks = {}  # key -> [lock, users]; dropped when the last user leaves
+_local_compute_guard = threading.Lock()
+
+
+@contextmanager
+def compute_lock(key: str):
+    """Hold key's build lock across processes. Stops waiting after COMPUTE_LOCK_TIMEOUT
+    seconds and runs unlocked: duplicate work beats a hung request."""
+    if not key:
+        yield
+        return
+    if fcntl is None:
+        with _local_compute_guard:
+            entry = _local_compute_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        with timed("lock_wait"):
+            acquired = entry[0].acquire(timeout=COMPUTE_LOCK_TIMEOUT)
+        try:
+            yield
+        finally:
+            if acquired:
+                entry[0].release()
+            with _local_compute_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del _local_compute_locks[key]
+        return
+    os.makedirs(COMPUTE_LOCK_DIR, exist_ok=True)
+    path = os.path.join(COMPUTE_LOCK_DIR, f"{key}.lock")
+    with timed("lock_wait"):
+        fh, acquired = _flock_file(path, time.monotonic() + COMPUTE_LOCK_TIMEOUT)
+    try:
+        yield
+    finally:
+        if acquired:
+            try:
+                os.remove(path)  # still held, so waiters see it gone and lock a fresh file
+            except OSError:
+                pass
+        fh.close()
+        if acquired:
+            prune_compute_locks()
+
+
+def _flock_file(path: str, deadline: float):
+    """Open and exclusively flock path: (file, True), or (file, False) past deadline.
+
+    A holder deletes the file before letting go, so a lock won on a file that is
+    no longer at path is stale and the new one is locked instead.
+    """
+    while True:
+        fh = open(path, "a")
+        while True:
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if time.monotonic() > deadline:
+                    return fh, False
+                time.sleep(0.05)
+        try:
+            if os.stat(path).st_ino == os.fstat(fh.fileno()).st_ino:
+                return fh, True
+        except FileNotFoundError:
+            pass
+        fh.close()
+
+
+def prune_compute_locks(max_age: float = None):
+    """Delete lock files left by crashed holders (untouched for max_age, default
+    COMPUTE_LOCK_TIMEOUT). Only files nobody holds are deleted."""
+    max_age = COMPUTE_LOCK_TIMEOUT if max_age is None else max_age
+    now = time.time()
+    try:
+        entries = list(os.scandir(COMPUTE_LOCK_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if now - entry.stat().st_mtime <= max_age:
+                continue
+            with open(entry.path, "a") as fh:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                if os.stat(entry.path).st_ino == os.fstat(fh.fileno()).st_ino:
+                    os.remove(entry.path)
+        except OSError:  # held (BlockingIOError), or already gone
+            continue
+
+
+# ---------------- incremental ingestion ----------------
+# A term's sheet grows a week at a time and is re-uploaded whole. With
+# REPORT_INCREMENTAL=1, .xlsx reports are built by the streaming accumulator
+# and its state (count cube plus side tables) is kept in increment_cache,
+# fingerprinted by a running hash of the rows it consumed. A later upload with
+# the same header picks the longest stored version whose first
+# INCREMENTAL_HEAD_ROWS rows hash the same, hashes on to that version's length
+# and, if the whole prefix matches, resumes from its state: only the rows after
+# it are cleaned, classified and folded, and its snapshot is extended rather
+# than rewritten. Folding is exact, so the report equals a full rebuild; a
+# prefix that diverges past the head falls back to one. The workbook is still
+# parsed end to end, since that is how unchanged rows are told apart.
+REPORT_INCREMENTAL = os.environ.get("REPORT_INCREMENTAL", "0") == "1"
+INCREMENTAL_HEAD_ROWS = 1000   # early fingerprint: other sheets with the same header drop out here
+INCREMENTAL_KEEP = 8           # versions remembered per header
+INCREMENT_CACHE_MAX_BYTES = int(os.environ.get("INCREMENT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+increment_cache = ReportCache(os.path.join(REPORT_CACHE_DIR, "increments"), INCREMENT_CACHE_MAX_BYTES,
+                              REPORT_CACHE_DISK_MAX_BYTES)
+
+
+def _can_increment(path: str) -> bool:
+    return REPORT_INCREMENTAL and bool(path) and path.lower().endswith(".xlsx")
+
+
+class _HashedRows:
+    """Row iterator keeping a running SHA-256 of the rows it has yielded."""
+
+    def __init__(self, rows, sig: str):
+        self._rows = rows
+        self._hash = hashlib.sha256(sig.encode())
+        self.n = 0
+        self.head = None   # digest after INCREMENTAL_HEAD_ROWS rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self._rows)
+        self._hash.update(repr(row).encode())
+        self.n += 1
+        if self.n == INCREMENTAL_HEAD_ROWS:
+            self.head = self.digest()
+        return row
+
+    def digest(self) -> str:
+        return self._hash.hexdigest()
+
+    def entry(self, key: str) -> dict:
+        """This sheet's fingerprint, once every row has been read."""
+        digest = self.digest()
+        return {"key": key, "rows": self.n, "digest": digest,
+                "head_rows": min(self.n, INCREMENTAL_HEAD_ROWS), "head": self.head or digest}
+
+
+def _resume(rows: _HashedRows, candidates: list):
+    """(accumulator, earlier version's key or None, rows read but not covered by it).
+    None when the picked version diverges past its head or its state is gone."""
+    wanted = {c["head_rows"] for c in candidates}
+    marks, head = {}, []
+    if candidates:
+        for row in rows:
+            head.append(row)
+            if rows.n in wanted:
+                marks[rows.n] = rows.digest()
+            if rows.n >= INCREMENTAL_HEAD_ROWS:
+                break
+    matches = [c for c in candidates if marks.get(c["head_rows"]) == c["head"] and has_snapshot(c["key"])]
+    if not matches:
+        return ReportAccumulator(), None, head
+    picked = max(matches, key=lambda c: c["rows"])
+    if picked["rows"] > rows.n:
+        for _ in rows:
+            if rows.n == picked["rows"]:
+                break
+        if rows.n != picked["rows"] or rows.digest() != picked["digest"]:
+            return None
+        head = []
+    else:
+        head = head[picked["rows"]:]   # within the head the check above covered every row
+    with timed("resume"):
+        acc = increment_cache.get(picked["key"])
+    return (acc, picked["key"], head) if acc is not None else None
+
+
+def build_report_incremental(path: str, key: str, chunk_rows: int = STREAM_CHUNK_ROWS, on_cube=None) -> dict:
+    """build_report_streaming that resumes from a stored earlier version of the sheet when
+    this one starts with all of its rows, then stores its own state for the next version."""
+    collected = []
+    rows = _excel_rows(path, collected)
+    columns, as_str = next(rows, (None, False))
+    if columns is None:
+        return build_report_streaming(path, chunk_rows, on_cube=on_cube, key=key)
+    sig = hashlib.sha256(f"{SNAPSHOT_VERSION}:{columns!r}:{as_str}".encode()).hexdigest()
+    index_key = f"{sig}-index"
+    candidates = [c for c in increment_cache.get(index_key) or [] if c["key"] != key]
+
+    with timed("parse_stream"), SnapshotWriter(key) as snapshot:
+        rows = _HashedRows(rows, sig)
+        resumed = _resume(rows, candidates)
+        if resumed is None:
+            collected.clear()
+            rows = _excel_rows(path, collected)
+            next(rows)
+            rows = _HashedRows(rows, sig)
+            resumed = _resume(rows, [])
+        acc, earlier, pending = resumed
+
+        if earlier is not None:
+            # the earlier version's cleaned rows are this snapshot's first rows
+            snap = open_snapshot(earlier)
+            if snap is None:
+                snapshot.abort()
+            for batch in snap[0].to_batches() if snap is not None else []:
+                snapshot.write(batch.to_pandas())
+        for chunk in _row_frames(columns, itertools.chain(pending, rows), as_str, chunk_rows):
+            clean, stats = clean_dataframe(chunk)
+            snapshot.write(clean)
+            acc.add(clean, stats)
+        preview = _preview_frame(collected)
+        snapshot.close(acc.cleaning_stats, preview)
+
+    if key:
+        with timed("increment_write"):
+            increment_cache.put(key, acc)
+            # best effort: a concurrent upload of another version may drop one entry
+            index = [c for c in increment_cache.get(index_key) or [] if c["key"] != key]
+            increment_cache.put(index_key, (index + [rows.entry(key)])[-INCREMENTAL_KEEP:])
+    return acc.report(sample=preview, on_cube=on_cube)
+
+
+# ---------------- report sections ----------------
+# The page only inlines the "summary" section; the top lists and heatmap
+# capacities are fetched from /report/<id>/<section> when the UI first needs
+# them. The student list, high-risk table and sample rows never reach the page
+# as JSON: the template renders the last two and the typeahead searches the
+# first through /api/students/search.
+REPORT_SECTIONS = {
+    "top_students": ("global_top_students_att", "module_top_students_att"),
+    "heatmap": ("module_week_capacity",),
+}
+_SERVER_ONLY_KEYS = {"student_lookup", "high_risk_students", "sample_rows"}
+_SECTIONED_KEYS = {k for keys in REPORT_SECTIONS.values() for k in keys} | _SERVER_ONLY_KEYS
+
+
+def report_section(report: dict, name: str) -> dict:
+    """The slice of a report belonging to one section ("summary" = everything not sectioned)."""
+    if name == "summary":
+        return {k: v for k, v in report.items() if k not in _SECTIONED_KEYS}
+    return {k: report.get(k) for k in REPORT_SECTIONS[name]}
+
+
+# ---------------- columnar snapshots ----------------
+# The cleaned frame of every parsed upload is written once as Feather (Arrow
+# IPC) next to a small JSON header, so later requests for the same bytes load
+# it memory-mapped instead of re-parsing the workbook. Bump SNAPSHOT_VERSION
+# whenever clean_dataframe changes what it produces; older files are ignored.
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # snapshots are an optimisation, not a requirement
+    pa = feather = None
+
+SNAPSHOT_VERSION = 3
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "soit_snapshots"))
+SNAPSHOT_DISK_MAX_BYTES = int(os.environ.get("SNAPSHOT_DISK_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+
+
+def _snapshot_paths(key: str):
+    base = os.path.join(SNAPSHOT_DIR, f"{key}.v{SNAPSHOT_VERSION}")
+    return base + ".feather", base + ".json"
+
+
+def _header_schema(df: pd.DataFrame) -> list:
+    return [{"name": str(c), "dtype": str(df[c].dtype)} for c in df.columns]
+
+
+def _remove_quietly(*paths):
+    for path in paths:
+        if not path:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class SnapshotWriter:
+    """Writes a cleaned frame to an upload's snapshot one chunk at a time.
+
+    Every chunk must have the first one's columns and types. Anything Arrow
+    can't hold (mixed-type or duplicate columns) drops the snapshot instead of
+    failing the caller, and so does leaving the with-block without close().
+    """
+
+    def __init__(self, key: str):
+        self.key = key if feather is not None else None
+        self.rows = 0
+        self._schema = None   # _header_schema of the first chunk
+        self._arrow = None    # ... and its Arrow schema
+        self._writer = None
+        self._tmp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.abort()
+
+    def write(self, df: pd.DataFrame):
+        if not self.key:
+            return
+        try:
+            if self._writer is None:
+                os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+                fd, self._tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix=".tmp")
+                os.close(fd)
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._schema, self._arrow = _header_schema(df), table.schema
+                # Feather's own format: an Arrow IPC file, lz4-compressed
+                self._writer = pa.ipc.new_file(self._tmp, table.schema,
+                                               options=pa.ipc.IpcWriteOptions(compression="lz4"))
+            elif _header_schema(df) != self._schema:
+                raise TypeError("chunk schema differs from the first chunk's")
+            else:
+                table = pa.Table.from_pandas(df, schema=self._arrow, preserve_index=False)
+            self._writer.write_table(table)
+            self.rows += len(df)
+        except Exception:
+            self.abort()
+
+    def close(self, cleaning_stats: dict, preview: pd.DataFrame = None) -> bool:
+        """Publish the snapshot (with the report's preview rows, if given); returns
+        False if nothing (or nothing storable) was written."""
+        if not self.key or self._writer is None:
+            return False
+        data_path, meta_path = _snapshot_paths(self.key)
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "rows": self.rows,
+            "schema": self._schema,
+            "cleaning_stats": cleaning_stats,
+        }
+        if preview is not None:
+            # read_preview's cells are strings or missing, so they fit JSON as they are
+            meta["preview"] = {"columns": [str(c) for c in preview.columns],
+                               "data": preview.astype(object).where(preview.notna(), None).values.tolist()}
+        try:
+            self._writer.close()
+            self._writer = None
+            os.replace(self._tmp, data_path)
+            # header goes last: a readable header implies a complete data file
+            fd, self._tmp = tempfile.mkstemp(dir=SNAPSHOT_DIR, suffix=".tmp")
+            with os.fdopen(fd, "w") as fh:
+                json.dump(meta, fh)
+            os.replace(self._tmp, meta_path)
+            self._tmp = None
+            _prune_dir(SNAPSHOT_DIR, SNAPSHOT_DISK_MAX_BYTES)
+            return True
+        except Exception:
+            self.abort()
+            _remove_quietly(data_path, meta_path)
+            return False
+        finally:
+            self.key = None
+
+    def abort(self):
+        """Drop whatever was written; later writes are ignored."""
+        self.key = None
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+        _remove_quietly(self._tmp)
+        self._tmp = None
+
+
+def write_snapshot(key: str, df: pd.DataFrame, cleaning_stats: dict, preview: pd.DataFrame = None) -> bool:
+    """Persist a cleaned frame; returns False if it can't be stored as Arrow."""
+    with SnapshotWriter(key) as snapshot:
+        snapshot.write(df.reset_index(drop=True))
+        return snapshot.close(cleaning_stats, preview)
+
+
+def open_snapshot(key: str):
+    """Return (memory-mapped Arrow table, header) for a stored upload, or None."""
+    if feather is None or not key:
+        return None
+    data_path, meta_path = _snapshot_paths(key)
+    try:
+        with open(meta_path) as fh:
+            meta = json.load(fh)
+        if meta.get("version") != SNAPSHOT_VERSION:
+            return None
+        table = feather.read_table(data_path, memory_map=True)
+        os.utime(data_path)
+        os.utime(meta_path)
+    except Exception:
+        return None
+    if _header_schema(table.schema.empty_table().to_pandas()) != meta.get("schema") or table.num_rows != meta.get("rows"):
+        return None
+    return table, meta
+
+
+def load_snapshot(key: str):
+    """Return (cleaned_df, cleaning_stats) for a stored upload, or None."""
+    snap = open_snapshot(key)
+    if snap is None:
+        return None
+    table, meta = snap
+    return table.to_pandas(), meta["cleaning_stats"]
+
+
+def build_report_from_snapshot(key: str, on_cube=None, path: str = None):
+    """build_report over an upload's snapshot, fed to the accumulator in
+    STREAM_CHUNK_ROWS batches; None when there is no snapshot. The preview
+    rows come from the snapshot, else from the workbook at path if it's still there."""
+    with timed("snapshot_load"):
+        snap = open_snapshot(key)
+    if snap is None:
+        return None
+    table, meta = snap
+    cleaning_stats = meta["cleaning_stats"]
+    preview = None
+    if "preview" in meta:
+        preview = pd.DataFrame(meta["preview"]["data"], columns=meta["preview"]["columns"], dtype=str)
+    elif path and os.path.exists(path):
+        preview = read_preview(path)
+    acc = ReportAccumulator()
+    with timed("aggregate"):
+        batches = table.to_batches(max_chunksize=STREAM_CHUNK_ROWS)
+        if not batches:
+            acc.add(table.to_pandas(), cleaning_stats)
+        for i, batch in enumerate(batches):
+            # the stats cover the whole snapshot: count them once
+            acc.add(batch.to_pandas(), cleaning_stats if i == 0 else dict.fromkeys(cleaning_stats, 0))
+    return acc.report(sample=preview, on_cube=on_cube)
+
+
+def has_snapshot(key: str) -> bool:
+    return bool(key) and os.path.exists(_snapshot_paths(key)[1])
+
+
+def load_clean_frame(key: str, load_df):
+    """Cleaned frame for an upload: from its snapshot, else parsed, cleaned and snapshotted."""
+    with timed("snapshot_load"):
+        snap = load_snapshot(key)
+    if snap is not None:
+        return snap
+    with compute_lock(key):
+        # another worker may have written it while we waited
+        with timed("snapshot_load"):
+            snap = load_snapshot(key)
+        if snap is not None:
+            return snap
+        return _parse_clean_snapshot(key, load_df)
+
+
+def _parse_clean_snapshot(key: str, load_df, preview: pd.DataFrame = None):
+    """The snapshot-miss path of load_clean_frame: parse, clean, snapshot."""
+    with timed("parse"):
+        raw = load_df()
+    with timed("clean"):
+        df, cleaning_stats = clean_dataframe(raw)
+    with timed("snapshot_write"):
+        write_snapshot(key, df, cleaning_stats, preview)
+    return df, cleaning_stats
+
+
+def _build_and_cache(key: str, path: str, progress=None) -> tuple:
+    """Build an upload's report, FilterIndex and StudentIndex in one pass and cache all three.
+
+    Runs under compute_lock(key); if another worker cached all three while we
+    waited for it, theirs are returned instead.
+    """
+    with compute_lock(key):
+        if key:
+            with timed("cache_read"):
+                report, index = report_cache.get(key), filter_cache.get(key)
+                students = get_student_index(key) if report is not None and index is not None else None
+            if students is not None:
+                return report, index
+        return _build_and_cache_locked(key, path, progress)
+
+
+def _build_and_cache_locked(key: str, path: str, progress=None) -> tuple:
+    progress = progress or (lambda phase, fraction: None)
+    built = {}
+
+    def on_cube(cube):
+        built["index"] = FilterIndex(cube)
+        built["students"] = StudentIndex(cube)
+    progress("parsing", 0.1)
+    report = build_report_from_snapshot(key, on_cube=on_cube, path=path)
+    if report is None and _can_increment(path):
+        report = build_report_incremental(path, key, on_cube=on_cube)
+    elif report is None and _should_stream(path):
+        report = build_report_streaming(path, on_cube=on_cube, key=key)
+    elif report is None:
+        preview = read_preview(path)
+        df, cleaning_stats = _parse_clean_snapshot(key, lambda: read_upload(path), preview)
+        progress("analysing", 0.5)
+        report = build_report(df, cleaning_stats, sample=preview, on_cube=on_cube)
+    built["students"].attach_lookup(report["student_lookup"])
+    progress("caching", 0.9)
+    if key:
+        with timed("cache_write"):
+            report_cache.put(key, report)
+            filter_cache.put(key, built["index"])
+            student_cache.put(key, built["students"])
+            _keep_live(key, built["students"])
+    return report, built["index"]
+
+
+def get_or_build_report(key: str, path: str) -> dict:
+    """Serve a report from the cache, building (and caching) it on a miss."""
+    report = report_cache.get(key) if key else None
+    if report is None:
+        report, _ = _build_and_cache(key, path)
+    return report
+
+
+def _keep_live(key: str, index):
+    with _live_lock:
+        _live_student_index[key] = index
+        _live_student_index.move_to_end(key)
+        while len(_live_student_index) > STUDENT_INDEX_LIVE:
+            _live_student_index.popitem(last=False)
+
+
+def get_student_index(key: str):
+    """StudentIndex for an upload from this process or the shared cache (None if neither has it)."""
+    with _live_lock:
+        index = _live_student_index.get(key)
+        if index is not None:
+            _live_student_index.move_to_end(key)
+            return index
+    index = student_cache.get(key) if key else None
+    if index is not None:
+        _keep_live(key, index)
+    return index
+
+
+def get_or_build_student_index(key: str, path: str) -> StudentIndex:
+    """StudentIndex for an upload, rebuilt from its snapshot / file if it was evicted."""
+    index = get_student_index(key)
+    if index is None:
+        _build_and_cache(key, path)
+        index = get_student_index(key)
+    return index
+
+
+def get_or_build_filter_index(key: str, path: str) -> FilterIndex:
+    """FilterIndex for an upload, rebuilt from its snapshot / file if it was evicted."""
+    index = filter_cache.get(key) if key else None
+    if index is None:
+        _, index = _build_and_cache(key, path)
+    return index
+
+
+# ---------------- analytics store ----------------
+# With ANALYTICS_DB set (it is off by default), each analysed upload's count
+# cube is also appended, once, to that SQLite database, so trends over weeks and
+# terms are read through its indexes instead of re-reading workbooks. Cumulative
+# workbooks repeat earlier weeks, so each upload belongs to a source: the sheet
+# it is a version of, by default its file name, or the source of the upload it
+# names as superseded. For every (term, source, week number) only the latest
+# upload containing it counts, which is what the current_facts view selects;
+# different sheets in one term all count.
+# The /api/history routes answer only requests bearing ANALYTICS_TOKEN
+# (Authorization: Bearer ...) and are off without one: history spans every
+# user's uploads, so no session can scope it.
+# Every ingest drops uploads older than ANALYTICS_TTL_SECONDS and all but the
+# newest ANALYTICS_MAX_UPLOADS, facts included, so the file stays bounded.
+# WAL mode lets web workers and pool processes read while one of them writes.
+ANALYTICS_DB = os.environ.get("ANALYTICS_DB", "")
+ANALYTICS_TOKEN = os.environ.get("ANALYTICS_TOKEN", "")
+ANALYTICS_BUSY_TIMEOUT = float(os.environ.get("ANALYTICS_BUSY_TIMEOUT", 30))
+ANALYTICS_TTL_SECONDS = int(os.environ.get("ANALYTICS_TTL_SECONDS", 400 * 24 * 3600))   # 0 = no age limit
+ANALYTICS_MAX_UPLOADS = int(os.environ.get("ANALYTICS_MAX_UPLOADS", 500))
+ANALYTICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploads (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    term TEXT NOT NULL,
+    name TEXT,
+    source TEXT NOT NULL,
+    ingested REAL NOT NULL,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS facts (
+    upload INTEGER NOT NULL REFERENCES uploads(id),
+    term TEXT NOT NULL,
+    source TEXT NOT NULL,
+    student TEXT,
+    module TEXT,
+    week TEXT,
+    week_no INTEGER NOT NULL,
+    att INTEGER,
+    risk TEXT,
+    resolved INTEGER,
+    qual TEXT,
+    n INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS facts_term_week ON facts (term, week_no, upload);
+CREATE INDEX IF NOT EXISTS facts_student ON facts (student, term, week_no);
+CREATE INDEX IF NOT EXISTS facts_module ON facts (module, term, week_no);
+CREATE INDEX IF NOT EXISTS facts_upload ON facts (upload);
+CREATE TABLE IF NOT EXISTS upload_weeks (
+    term TEXT NOT NULL,
+    source TEXT NOT NULL,
+    week_no INTEGER NOT NULL,
+    upload INTEGER NOT NULL,
+    PRIMARY KEY (term, source, week_no, upload)
+) WITHOUT ROWID;
+CREATE VIEW IF NOT EXISTS current_facts AS
+    SELECT f.* FROM facts f
+    WHERE f.upload = (SELECT MAX(w.upload) FROM upload_weeks w
+                      WHERE w.term = f.term AND w.source = f.source AND w.week_no = f.week_no);
+"""
+_FACT_TEXT = ("student", "module", "week", "risk", "qual")
+
+
+def _week_no(week) -> int:
+    """Number in a week label ("Week 3" -> 3), 0 if none; the store's time axis."""
+    m = re.search(r"(\d+)", str(week))
+    return int(m.group(1)) if m else 0
+
+
+class AnalyticsStore:
+    """SQLite history of upload count cubes, pruned on ingest (one connection per thread)."""
+
+    def __init__(self, path: str, ttl: int = ANALYTICS_TTL_SECONDS, max_uploads: int = ANALYTICS_MAX_UPLOADS):
+        self.path = path
+        self.ttl = ttl
+        self.max_uploads = max_uploads
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # autocommit; ingest() opens its own transaction
+            conn = sqlite3.connect(self.path, timeout=ANALYTICS_BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(ANALYTICS_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def has(self, key: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM uploads WHERE key = ?", (key,)).fetchone() is not None
+
+    def ingest(self, key: str, cube: pd.DataFrame, term: str = "", name: str = None, supersedes: str = None) -> bool:
+        """Append an upload's count cube; False if that upload is already stored.
+
+        It replaces the weeks of earlier uploads of its source: the one of the
+        stored upload named (by key or file name) in supersedes, else its name.
+        """
+        cols = {}
+        for role in _FACT_TEXT:
+            s = cube[role].astype(object) if role in cube.columns else pd.Series(None, index=cube.index, dtype=object)
+            cols[role] = s.where(s.notna(), None).tolist()
+        for role in ("att", "resolved"):
+            cols[role] = cube[role].astype(int).tolist() if role in cube.columns else [None] * len(cube)
+        week_nos = {w: _week_no(w) for w in set(cols["week"])}
+        cols["week_no"] = [week_nos[w] for w in cols["week"]]
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.has(key):
+                conn.execute("ROLLBACK")
+                return False
+            source = None
+            if supersedes:
+                row = conn.execute("SELECT source FROM uploads WHERE key = ? OR name = ? ORDER BY id DESC LIMIT 1",
+                                   (supersedes, supersedes)).fetchone()
+                source = row[0] if row else supersedes
+            source = source or name or key
+            upload = conn.execute(
+                "INSERT INTO uploads (key, term, name, source, ingested, rows) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, term, name, source, time.time(), int(cube["_n"].sum())),
+            ).lastrowid
+            conn.executemany(
+                "INSERT INTO facts (upload, term, source, student, module, week, week_no, att, risk, resolved, qual, n)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                zip([upload] * len(cube), [term] * len(cube), [source] * len(cube), cols["student"], cols["module"],
+                    cols["week"], cols["week_no"], cols["att"], cols["risk"], cols["resolved"], cols["qual"],
+                    cube["_n"].astype(int).tolist()),
+            )
+            conn.executemany("INSERT OR IGNORE INTO upload_weeks (term, source, week_no, upload) VALUES (?, ?, ?, ?)",
+                             [(term, source, w, upload) for w in set(cols["week_no"])])
+            self._prune(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def _prune(self, conn: sqlite3.Connection):
+        """Delete uploads past the age / count limits with their facts (oldest first, so a
+        sheet's newer versions outlive the ones they superseded)."""
+        cutoff = time.time() - self.ttl if self.ttl else float("-inf")
+        expired = "SELECT id FROM uploads WHERE ingested < ? OR id NOT IN (SELECT id FROM uploads ORDER BY id DESC LIMIT ?)"
+        for table, col in (("facts", "upload"), ("upload_weeks", "upload"), ("uploads", "id")):
+            conn.execute(f"DELETE FROM {table} WHERE {col} IN ({expired})", (cutoff, self.max_uploads))
+
+    def uploads(self) -> list:
+        # the store's own ids: an upload's key is its report id, which would open its report
+        rows = self._conn().execute("SELECT id, term, name, source, ingested, rows FROM uploads ORDER BY id").fetchall()
+        return [dict(zip(("id", "term", "name", "source", "ingested", "rows"), r)) for r in rows]
+
+    def cube(self, term: str = None, week_from: int = None, week_to: int = None, quals=None) -> pd.DataFrame:
+        """The current count cube over a term and week-number range (None = unbounded), shaped like build_cube's."""
+        where, args = [], []
+        if term is not None:
+            where.append("term = ?")
+            args.append(term)
+        if week_from is not None:
+            where.append("week_no >= ?")
+            args.append(int(week_from))
+        if week_to is not None:
+            where.append("week_no <= ?")
+            args.append(int(week_to))
+        if quals:
+            where.append(f"qual IN ({', '.join('?' * len(quals))})")
+            args.extend(quals)
+        sql = "SELECT student, module, week, att, risk, resolved, qual, SUM(n) FROM current_facts"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " GROUP BY student, module, week, att, risk, resolved, qual"
+        keys = ["student", "module", "week", "att", "risk", "resolved", "qual"]
+        cube = pd.DataFrame(self._conn().execute(sql, args).fetchall(), columns=keys + ["_n"])
+        # roles no stored upload had are left out, as build_cube leaves them out
+        cube = cube[[c for c in keys if cube[c].notna().any()] + ["_n"]]
+        for role in ("att", "resolved"):
+            if role in cube.columns:
+                cube[role] = cube[role].fillna(0).astype(bool)
+        for role in _FACT_TEXT:
+            if role in cube.columns:
+                cube[role] = cube[role].astype("category")
+        return cube
+
+    def aggregates(self, term: str = None, week_from: int = None, week_to: int = None, quals=None) -> dict:
+        """cube_metrics over stored history, like FilterIndex.aggregates over one upload."""
+        quals = sorted(str(q) for q in quals or [])
+        out = cube_metrics(self.cube(term, week_from, week_to, quals))
+        out.update(term=term, week_from=week_from, week_to=week_to, qualifications=quals)
+        return out
+
+    def student_history(self, sid: str) -> dict:
+        """One student's weeks across every stored term, oldest first."""
+        conn = self._conn()
+        term_order = {t: i for i, (t,) in enumerate(conn.execute("SELECT term FROM uploads GROUP BY term ORDER BY MIN(id)"))}
+        rows = conn.execute(
+            "SELECT term, week_no, week, module, risk, att, SUM(n) FROM current_facts WHERE student = ?"
+            " GROUP BY term, week_no, week, module, risk, att",
+            (sid,),
+        ).fetchall()
+        weeks = {}
+        for term, week_no, week, module, risk, att, n in rows:
+            entry = weeks.setdefault((term_order.get(term, len(term_order)), week_no, term, week), {
+                "term": term, "week": week, "records": 0, "absences": 0, "risk": None, "modules_att": {},
+            })
+            entry["records"] += n
+            if att:
+                entry["absences"] += n
+                if module is not None:
+                    entry["modules_att"][module] = entry["modules_att"].get(module, 0) + n
+            if risk is not None and (entry["risk"] is None or _risk_rank(risk) > _risk_rank(entry["risk"])):
+                entry["risk"] = risk
+        history = [weeks[k] for k in sorted(weeks, key=lambda k: (k[0], k[1], str(k[3])))]
+        return {
+            "id": sid,
+            "weeks": history,
+            "records": sum(w["records"] for w in history),
+            "absences": sum(w["absences"] for w in history),
+        }
+
+
+analytics_store = AnalyticsStore(ANALYTICS_DB) if ANALYTICS_DB else None
+
+
+def record_history(key: str, index, term: str = "", name: str = None, supersedes: str = None):
+    """Append an upload (its FilterIndex's cube) to the analytics store; history never fails an upload."""
+    if analytics_store is None or not key or index is None:
+        return
+    with timed("ingest"):
+        try:
+            analytics_store.ingest(key, index.cube, term or "", name, supersedes or None)
+        except sqlite3.Error:
+            pass
+
+
+# ---------------- upload store ----------------
+# Uploaded workbooks live under UPLOAD_DIR named by content hash, so the same
+# bytes uploaded twice share one file. A file's mtime is its last use: saving
+# or reading it through use_upload() touches it. After every save, files idle
+# for UPLOAD_TTL_SECONDS are removed, then the least recently used until the
+# directory fits UPLOAD_DISK_MAX_BYTES. Several web workers share the directory:
+# eviction takes an exclusive flock on UPLOAD_DIR/.lock while saves and touches
+# take a shared one, and nothing used in the last UPLOAD_GRACE_SECONDS is
+# evicted, so a job queued by one worker still finds its file (without flock,
+# on Windows, eviction relies on that grace period alone).
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "soit_uploads"))
+UPLOAD_TTL_SECONDS = int(os.environ.get("UPLOAD_TTL_SECONDS", 24 * 3600))
+UPLOAD_DISK_MAX_BYTES = int(os.environ.get("UPLOAD_DISK_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+UPLOAD_GRACE_SECONDS = int(os.environ.get("UPLOAD_GRACE_SECONDS", 600))
+
+
+@contextmanager
+def _upload_lock(exclusive: bool = False):
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    with open(os.path.join(UPLOAD_DIR, ".lock"), "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield  # closing the file releases the lock
+
+
+def store_upload(stream, ext: str) -> tuple:
+    """Copy a stream into the upload store in blocks, hashing it on the way; returns (path, hash)."""
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".tmp")
+    h = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            for block in iter(lambda: stream.read(1024 * 1024), b""):
+                h.update(block)
+                fh.write(block)
+        key = h.hexdigest()
+        path = os.path.join(UPLOAD_DIR, f"{key}.{ext}")
+        with _upload_lock():
+            try:
+                os.utime(path)  # already stored: keep that copy
+                os.remove(tmp)
+            except FileNotFoundError:
+                os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    prune_uploads()
+    return path, key
+
+
+def use_upload(path: str):
+    """Touch a stored upload as used now; returns its path, or None if it is gone (evicted)."""
+    if not path:
+        return None
+    with _upload_lock():
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+    return path
+
+
+def prune_uploads():
+    """Apply the upload store's TTL and size bound."""
+    with _upload_lock(exclusive=True):
+        _prune_dir(UPLOAD_DIR, UPLOAD_DISK_MAX_BYTES, max_age=UPLOAD_TTL_SECONDS, keep_recent=UPLOAD_GRACE_SECONDS)
+
+
+# ---------------- background jobs ----------------
+# Uploads are parsed and analysed on a small local process pool so a large
+# workbook doesn't hold a web worker. Job state lives in JSON files under
+# JOB_DIR (written atomically by the pool process), so any web worker can
+# answer a poll. UPLOAD_WORKERS=0 runs jobs inline in the request instead.
+# Every web worker has its own pool, so JOB_SLOTS caps how many jobs run at
+# once across all of them (flocks on JOB_DIR/.slot-<i>); the rest wait queued.
+# Pool processes never serve requests, so they write results to the caches'
+# disk tier only and keep nothing in memory between jobs.
+JOB_DIR = os.environ.get("JOB_DIR", os.path.join(tempfile.gettempdir(), "soit_jobs"))
+JOB_DISK_MAX_BYTES = int(os.environ.get("JOB_DISK_MAX_BYTES", 512 * 1024 * 1024))
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", 1))
+JOB_SLOTS = int(os.environ.get("JOB_SLOTS", 1))
+_pool = None
+_pool_lock = threading.Lock()
+_local_job_slots = threading.BoundedSemaphore(max(JOB_SLOTS, 1))
+
+
+@contextmanager
+def _job_slot():
+    """Hold one of JOB_SLOTS machine-wide job slots while the block runs."""
+    if fcntl is None:  # no flock: the slots only bound this process
+        with _local_job_slots:
+            yield
+        return
+    os.makedirs(JOB_DIR, exist_ok=True)
+    while True:
+        for i in range(max(JOB_SLOTS, 1)):
+            fh = open(os.path.join(JOB_DIR, f".slot-{i}"), "a")
+            try:
+                fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                fh.close()
+                continue
+            try:
+                yield
+            finally:
+                fh.close()  # releases the slot
+            return
+        time.sleep(0.2)
+
+
+def _job_path(job_id: str, ext: str = "json") -> str:
+    return os.path.join(JOB_DIR, f"{job_id}.{ext}")
+
+
+def read_job(job_id: str):
+    """Current state of a job, or None if unknown."""
+    if not re.fullmatch(r"[0-9a-f]{32}", job_id or ""):
+        return None
+    try:
+        with open(_job_path(job_id)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_job(job_id: str, **state) -> dict:
+    job = read_job(job_id) or {}
+    job.update(state, updated=time.time())
+    os.makedirs(JOB_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=JOB_DIR, suffix=".tmp")
+    with os.fdopen(fd, "w") as fh:
+        json.dump(job, fh)
+    os.replace(tmp, _job_path(job_id))
+    return job
+
+
+def _job_progress(job_id: str):
+    return lambda phase, fraction: _write_job(job_id, status="running", phase=phase, progress=fraction)
+
+
+def run_report_job(job_id: str, key: str, path: str, term: str = "", name: str = None, supersedes: str = None):
+    """Pool entry point: build and cache the report for an upload, and add it to the history."""
+    use_upload(path)  # a queued job counts as a use, pushing back eviction
+    with _job_slot(), collect_phases() as phases:
+        try:
+            _, index = _build_and_cache(key, path, progress=_job_progress(job_id))
+            record_history(key, index, term, name, supersedes)
+            _write_job(job_id, status="done", phase="done", progress=1.0, report_id=key, timings=phases)
+        except Exception as e:
+            _write_job(job_id, status="error", error=f"Failed to read Excel: {e}", timings=phases)
+
+
+def run_tracker_job(job_id: str, key: str, path: str, fmt: str = "xlsx"):
+    """Pool entry point: convert an upload to the tracker file (xlsx / csv / parquet) under JOB_DIR."""
+    progress = _job_progress(job_id)
+    tmp = None
+    use_upload(path)
+    with _job_slot(), collect_phases() as phases:
+        try:
+            progress("parsing", 0.1)
+            df, _ = load_clean_frame(key, lambda: read_upload(path))
+            progress("transforming", 0.5)
+            with timed("transform"):
+                transformed = transform_to_tracker(df)
+            progress("writing", 0.8)
+            with timed(f"write_{fmt}"):
+                fd, tmp = tempfile.mkstemp(dir=JOB_DIR, suffix=".tmp")
+                with os.fdopen(fd, "wb") as fh:
+                    write_export(transformed, fh, fmt, sheet="Tracker")
+                os.replace(tmp, _job_path(job_id, fmt))
+            _prune_dir(JOB_DIR, JOB_DISK_MAX_BYTES)
+            _write_job(job_id, status="done", phase="done", progress=1.0, timings=phases)
+        except Exception as e:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            _write_job(job_id, status="error", error=f"Conversion failed: {e}", timings=phases)
+
+
+JOB_KINDS = {"report": run_report_job, "tracker": run_tracker_job}
+JOB_ENDPOINTS = {"report": "upload", "tracker": "convert_tracker"}  # metrics are filed under the submitting route
+
+
+def _init_job_process():
+    """Pool initializer: no memory tier in the caches and no live student indexes."""
+    global STUDENT_INDEX_LIVE
+    for cache in (report_cache, filter_cache, student_cache, section_cache, increment_cache):
+        cache.max_bytes = 0
+    STUDENT_INDEX_LIVE = 0
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the web process may already run threads, which fork doesn't mix with
+            _pool = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_job_process)
+        return _pool
+
+
+def submit_job(kind: str, key: str, path: str, *args, **state) -> dict:
+    """Queue (or, with UPLOAD_WORKERS=0, run) a job; returns its state.
+
+    Extra args go to the job function, extra keyword args into the job's state.
+    """
+    global _pool
+    job_id = uuid.uuid4().hex
+    job = _write_job(job_id, id=job_id, kind=kind, status="queued", phase="queued", progress=0.0, **state)
+    if UPLOAD_WORKERS <= 0:
+        JOB_KINDS[kind](job_id, key, path, *args)
+        return read_job(job_id)
+
+    def on_done(future):
+        # the pool process died before it could record an outcome
+        if future.exception() is not None and (read_job(job_id) or {}).get("status") not in ("done", "error"):
+            _write_job(job_id, status="error", error=f"Job failed: {future.exception()}")
+        # the job's phases ran in the pool process; fold them into this process's metrics
+        phase_metrics.observe(JOB_ENDPOINTS[kind], (read_job(job_id) or {}).get("timings") or [])
+
+    try:
+        future = _get_pool().submit(JOB_KINDS[kind], job_id, key, path, *args)
+    except Exception:  # broken pool (a worker was killed): start a fresh one
+        with _pool_lock:
+            _pool = None
+        future = _get_pool().submit(JOB_KINDS[kind], job_id, key, path, *args)
+    future.add_done_callback(on_done)
+    return job
 
 
 # ---------------- flask app ----------------
@@ -640,10 +2744,58 @@ app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "super-secret-key")
 app.config["MAX_CONTENT_LENGTH"] = 64 * 1024 * 1024  # 64MB
 
+# /upload, /convert-tracker and /export-high-risk report their phases in a
+# Server-Timing header and feed phase_metrics (see /metrics). With
+# PROFILE_REQUESTS=1, adding ?profile=1 samples that one request's stack.
+INSTRUMENTED_ENDPOINTS = {"upload", "convert_tracker", "export_high_risk"}
+
+
+@app.before_request
+def _start_instrumentation():
+    if request.endpoint not in INSTRUMENTED_ENDPOINTS:
+        return
+    g.phase_scope = collect_phases()
+    g.phases = g.phase_scope.__enter__()
+    g.started = time.perf_counter()
+    if PROFILE_REQUESTS and request.args.get("profile") == "1":
+        g.profiler = SamplingProfiler(threading.get_ident()).start()
+
+
+@app.after_request
+def _finish_instrumentation(response):
+    phases = g.pop("phases", None)
+    if phases is None:
+        return response
+    g.pop("phase_scope").__exit__(None, None, None)
+    phases = phases + [{"name": "total", "ms": round((time.perf_counter() - g.pop("started")) * 1000, 2)}]
+    response.headers["Server-Timing"] = server_timing(phases)
+    phase_metrics.observe(request.endpoint, phases)
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        response.headers["X-Profile"] = profiler.stop(request.endpoint)
+    return response
+
+
+@app.teardown_request
+def _drop_instrumentation(exc):
+    # after_request is skipped when the view raised; still close the collector / profiler
+    scope = g.pop("phase_scope", None)
+    if scope is not None:
+        scope.__exit__(None, None, None)
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.stop(request.endpoint or "request")
+
+
 @app.route("/", methods=["GET"])
 def index():
     return render_template("index.html", report=None, filename=None, error=None)
 
+def save_upload(f) -> tuple:
+    """Put a request's file in the upload store; returns (path, content hash)."""
+    return store_upload(f.stream, f.filename.rsplit(".", 1)[1].lower())
+
+
 @app.route("/upload", methods=["POST"])
 def upload():
     if "file" not in request.files:
@@ -657,28 +2809,114 @@ def upload():
         return render_template("index.html", report=None, filename=None, error="Please upload an Excel file (.xlsx/.xls).")
 
     try:
-        content = f.read()
-
-        # create unique temp filename
-        tmp_name = f"/tmp/{uuid.uuid4()}.xlsx"
+        with timed("save"):
+            tmp_name, upload_hash = save_upload(f)
 
-        with open(tmp_name, "wb") as temp_file:
-            temp_file.write(content)
-
-        # store ONLY the file path (small string)
+        # store ONLY the file path + content hash (small strings)
         session["uploaded_excel_path"] = tmp_name
+        session["upload_hash"] = upload_hash
+        session["upload_name"] = secure_filename(f.filename)
+        term = request.form.get("term", "").strip()
+        supersedes = secure_filename(request.form.get("supersedes", ""))  # stored names went through it too
+
+        # seen these bytes before: no job needed
+        with timed("cache_read"):
+            report = report_cache.get(upload_hash)
+        if report is not None:
+            if analytics_store is not None and not analytics_store.has(upload_hash):
+                record_history(upload_hash, filter_cache.get(upload_hash), term, session["upload_name"], supersedes)
+            return _render_report(report, upload_hash)
+
+        job = submit_job("report", upload_hash, tmp_name, term, session["upload_name"], supersedes)
+        if job["status"] == "done":
+            return _render_report(report_cache.get(upload_hash), upload_hash)
+        if job["status"] == "error":
+            return render_template("index.html", report=None, filename=None, error=job["error"])
+        return render_template("index.html", report=None, job=job, filename=session["upload_name"], error=None)
+    except Exception as e:
+        return render_template("index.html", report=None, filename=None, error=f"Failed to read Excel: {e}")
 
-        df = pd.read_excel(BytesIO(content))
-        report = build_report(df)
 
+def _render_report(report: dict, report_id: str):
+    with timed("render"):
         return render_template(
             "index.html",
             report=report,
-            filename=secure_filename(f.filename),
+            report_id=report_id,
+            report_summary=report_section(report, "summary"),
+            filename=session.get("upload_name"),
             error=None
         )
-    except Exception as e:
-        return render_template("index.html", report=None, filename=None, error=f"Failed to read Excel: {e}")
+
+
+@app.route("/report/<report_id>", methods=["GET"])
+def report_page(report_id):
+    """The dashboard for a finished upload (where a job's page lands)."""
+    report = report_cache.get(report_id) if re.fullmatch(r"[0-9a-f]{64}", report_id) else None
+    if report is None:
+        path = session.get("uploaded_excel_path") if session.get("upload_hash") == report_id else None
+        if not has_snapshot(report_id) and use_upload(path) is None:
+            return render_template("index.html", report=None, filename=None, error="That report is no longer available. Please upload the file again.")
+        report = get_or_build_report(report_id, path)
+    return _render_report(report, report_id)
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = read_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+
+# An open event stream holds a request thread, so each one is short and a
+# worker serves only a few at once. When a stream ends (or is refused) the
+# page's EventSource errors and jobs.js falls back to polling /jobs/<id>.
+JOB_EVENTS_SECONDS = float(os.environ.get("JOB_EVENTS_SECONDS", 20))
+JOB_EVENTS_STREAMS = int(os.environ.get("JOB_EVENTS_STREAMS", 2))
+_event_streams = threading.BoundedSemaphore(max(JOB_EVENTS_STREAMS, 1))
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """Server-sent events: one message per state change until the job finishes (or JOB_EVENTS_SECONDS pass)."""
+    if read_job(job_id) is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    def stream():
+        if not _event_streams.acquire(blocking=False):
+            return  # this worker's streams are all taken: the client polls instead
+        try:
+            last = None
+            deadline = time.time() + JOB_EVENTS_SECONDS
+            while time.time() < deadline:
+                job = read_job(job_id) or {}
+                if job.get("updated") != last:
+                    last = job.get("updated")
+                    yield f"data: {json.dumps(job)}\n\n"
+                if job.get("status") in ("done", "error"):
+                    return
+                time.sleep(0.5)
+        finally:
+            _event_streams.release()
+
+    return Response(stream_with_context(stream()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/jobs/<job_id>/download", methods=["GET"])
+def job_download(job_id):
+    job = read_job(job_id)
+    fmt = (job or {}).get("format", "xlsx")
+    if not job or job.get("kind") != "tracker" or job.get("status") != "done" or not os.path.exists(_job_path(job_id, fmt)):
+        return render_template("index.html", report=None, filename=None, error="That conversion is not ready or has expired.")
+    # send_file streams the finished file from disk in blocks
+    return send_file(
+        _job_path(job_id, fmt),
+        as_attachment=True,
+        download_name=f"At_Risk_Tracker.{fmt}",
+        mimetype=EXPORT_FORMATS[fmt]
+    )
         
 @app.route("/convert-tracker", methods=["POST"])
 def convert_tracker():
@@ -691,63 +2929,245 @@ def convert_tracker():
     if not allowed_file(file.filename):
         return render_template("index.html", error="Only Excel files allowed.")
 
+    fmt = _export_format()
+    if fmt is None:
+        return render_template("index.html", error="Unknown export format.")
+
     try:
-        # ---- read file ----
-        df = pd.read_excel(file)
+        # ---- parse + transform + export run as a job (snapshot reused if these bytes were seen before) ----
+        with timed("save"):
+            tmp_name, key = save_upload(file)
+        job = submit_job("tracker", key, tmp_name, fmt, format=fmt)
+
+        # ---- send file (inline jobs), else the page polls until it can ----
+        if job["status"] == "done":
+            return job_download(job["id"])
+        if job["status"] == "error":
+            return render_template("index.html", report=None, filename=None, error=job["error"])
+        return render_template("index.html", report=None, job=job, filename=secure_filename(file.filename), error=None)
 
-        # ---- transform ----
-        transformed = transform_to_tracker(df)
+    except Exception as e:
+        return render_template("index.html", report=None, filename=None, error=f"Conversion failed: {str(e)}")
 
-        # ---- export to memory ----
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine="openpyxl") as writer:
-            transformed.to_excel(writer, index=False, sheet_name="Tracker")
 
-        output.seek(0)
+def _export_format():
+    """?format= / form field, defaulting to xlsx; None if unsupported."""
+    fmt = (request.values.get("format") or "xlsx").lower()
+    return fmt if fmt in EXPORT_FORMATS else None
 
-        # ---- send file ----
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="At_Risk_Tracker.xlsx",
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
 
-    except Exception as e:
-        return render_template("index.html", error=f"Conversion failed: {str(e)}")
+def _export_response(df: pd.DataFrame, fmt: str, name: str, sheet: str):
+    """Stream df as an attachment: CSV as it is generated, xlsx / parquet from a temp file."""
+    headers = {"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
+    if fmt == "csv":
+        return Response(stream_with_context(iter_csv(df)), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+    fd, tmp = tempfile.mkstemp(suffix=f".{fmt}")
+    try:
+        with timed(f"write_{fmt}"), os.fdopen(fd, "wb") as fh:
+            write_export(df, fh, fmt, sheet=sheet)
+    except Exception:
+        os.remove(tmp)
+        raise
+    headers["Content-Length"] = str(os.path.getsize(tmp))
+    return Response(stream_file(tmp, remove=True), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+
 
 @app.route("/export-high-risk", methods=["POST"])
 def export_high_risk():
     path = session.get("uploaded_excel_path")
-
-    if not path or not os.path.exists(path):
+    upload_hash = session.get("upload_hash")
+    fmt = _export_format()
+    if fmt is None:
+        return "Unknown export format"
+
+    with timed("cache_read"):
+        report = report_cache.get(upload_hash) if upload_hash else None
+    if report is None and not has_snapshot(upload_hash) and use_upload(path) is None:
         return "No data available"
 
     try:
-        df = pd.read_excel(path)
-        report = build_report(df)
-        high_risk = report.get("high_risk_students", [])
-
-        if not high_risk:
+        if report is None:
+            report = get_or_build_report(upload_hash, path)
+        frame = high_risk_frame(report)
+        if frame is None:
             return "No data available"
+        return _export_response(frame, fmt, "High_Risk_Students", sheet="High Risk Students")
 
-        df_export = pd.DataFrame(high_risk)
-
-        output = BytesIO()
-        with pd.ExcelWriter(output) as writer:
-            df_export.to_excel(writer, index=False, sheet_name="High Risk Students")
+    except Exception as e:
+        return f"Export failed: {e}"
 
-        output.seek(0)
 
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="High_Risk_Students.xlsx",
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+@app.route("/report/<report_id>/<section>", methods=["GET"])
+def report_section_json(report_id, section):
+    """One report section as gzipped JSON, revalidated by ETag."""
+    if (section != "summary" and section not in REPORT_SECTIONS) or not re.fullmatch(r"[0-9a-f]{64}", report_id):
+        return jsonify({"error": "Unknown report section"}), 404
+
+    # the id is a content hash, so a section never changes for a given cache version
+    etag = f"{report_id[:16]}-{section}-v{REPORT_CACHE_VERSION}"
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    key = f"{report_id}-{section}"
+    body = section_cache.get(key)
+    if body is None:
+        report = report_cache.get(report_id)
+        if report is None:
+            path = session.get("uploaded_excel_path") if session.get("upload_hash") == report_id else None
+            if not has_snapshot(report_id) and use_upload(path) is None:
+                return jsonify({"error": "No data available"}), 404
+            report = get_or_build_report(report_id, path)
+        body = gzip.compress(app.json.dumps(report_section(report, section)).encode("utf-8"), 6)
+        section_cache.put(key, body)
+
+    if "gzip" in request.accept_encodings:
+        resp = app.response_class(body, mimetype="application/json")
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp = app.response_class(gzip.decompress(body), mimetype="application/json")
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.set_etag(etag)
+    return resp
+
+
+def _request_upload() -> tuple:
+    """(report id, stored file) for ?report=<id>, default the session's upload; (None, None) if invalid.
+
+    The file is only known for the session's own upload; other reports come from caches / snapshots.
+    """
+    report_id = request.args.get("report") or session.get("upload_hash")
+    if not report_id or not re.fullmatch(r"[0-9a-f]{64}", report_id):
+        return None, None
+    return report_id, session.get("uploaded_excel_path") if session.get("upload_hash") == report_id else None
+
+
+def _request_student_index():
+    """StudentIndex for ?report=<id> (default: the session's upload), or None."""
+    report_id, path = _request_upload()
+    if report_id is None:
+        return None
+    index = get_student_index(report_id)
+    if index is None:
+        if not has_snapshot(report_id) and use_upload(path) is None:
+            return None
+        index = get_or_build_student_index(report_id, path)
+    return index
+
+
+@app.route("/student/<sid>", methods=["GET"])
+def student_view(sid):
+    """One student's drill-down (module / week / risk maps) for ?report=<id>, default the session upload."""
+    index = _request_student_index()
+    if index is None:
+        return jsonify({"error": "No data available"}), 404
+
+    sid = _sid(sid)
+    if sid not in index:
+        return jsonify({"error": f"Unknown student {sid}"}), 404
+    resp = jsonify(index.view(sid))
+    resp.headers["Cache-Control"] = "private, max-age=300"
+    return resp
+
+
+@app.route("/api/students/search", methods=["GET"])
+def api_student_search():
+    """Typeahead: ?q=<id prefix or name fragment>&k=10 over ?report=<id>, default the session upload."""
+    index = _request_student_index()
+    if index is None:
+        return jsonify({"error": "No data available"}), 404
+
+    k = max(1, min(request.args.get("k", 10, type=int), 50))
+    q = request.args.get("q", "")
+    return jsonify({"q": q, "matches": index.search(q, k)})
+
+
+@app.route("/api/aggregates", methods=["GET"])
+def api_aggregates():
+    """Dashboard aggregates for ?report=<id> (default: the session's upload), filtered by
+    ?weeks=…&qualifications=… (repeatable)."""
+    report_id, path = _request_upload()
+    index = filter_cache.get(report_id) if report_id else None
+    if index is None and (report_id is None or (not has_snapshot(report_id) and use_upload(path) is None)):
+        return jsonify({"error": "No data available"}), 404
 
+    try:
+        if index is None:
+            index = get_or_build_filter_index(report_id, path)
+        weeks = [w for v in request.args.getlist("weeks") for w in v.split(",") if w]
+        quals = [q for v in request.args.getlist("qualifications") for q in v.split(",") if q]
+        return jsonify(index.aggregates(weeks=weeks, quals=quals))
     except Exception as e:
-        return f"Export failed: {e}"
+        return jsonify({"error": f"Filter failed: {e}"}), 500
+
+
+
+def _history_denied():
+    """Error response for a history request without the store or ANALYTICS_TOKEN, else None."""
+    if analytics_store is None or not ANALYTICS_TOKEN:
+        return jsonify({"error": "History is disabled"}), 404
+    sent = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(sent.encode(), ANALYTICS_TOKEN.encode()):
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+
+@app.route("/api/history/uploads", methods=["GET"])
+def api_history_uploads():
+    """Uploads in the analytics store, oldest first."""
+    denied = _history_denied()
+    if denied:
+        return denied
+    return jsonify({"uploads": analytics_store.uploads()})
+
+
+@app.route("/api/history/aggregates", methods=["GET"])
+def api_history_aggregates():
+    """Dashboard aggregates over stored uploads: ?term=…&from=<week no>&to=<week no>&qualifications=… ."""
+    denied = _history_denied()
+    if denied:
+        return denied
+    quals = [q for v in request.args.getlist("qualifications") for q in v.split(",") if q]
+    try:
+        return jsonify(analytics_store.aggregates(
+            term=request.args.get("term"),
+            week_from=request.args.get("from", type=int),
+            week_to=request.args.get("to", type=int),
+            quals=quals,
+        ))
+    except sqlite3.Error as e:
+        return jsonify({"error": f"History query failed: {e}"}), 500
+
+
+@app.route("/api/history/student/<sid>", methods=["GET"])
+def api_history_student(sid):
+    """One student's week-by-week history across every stored upload and term."""
+    denied = _history_denied()
+    if denied:
+        return denied
+    history = analytics_store.student_history(_sid(sid))
+    if not history["weeks"]:
+        return jsonify({"error": f"Unknown student {_sid(sid)}"}), 404
+    return jsonify(history)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """This worker's per-phase histograms (ms, and peak MB when METRICS_TRACE_MEMORY=1)."""
+    return jsonify({"pid": os.getpid(), "trace_memory": tracemalloc.is_tracing(), "endpoints": phase_metrics.snapshot()})
+
+
+@app.route("/metrics/profiles/<name>", methods=["GET"])
+def metrics_profile(name):
+    """A ?profile=1 request's folded stacks (flamegraph.pl / speedscope input)."""
+    if not PROFILE_REQUESTS or not re.fullmatch(r"[A-Za-z0-9_.-]+\.folded", name):
+        return jsonify({"error": "Unknown profile"}), 404
+    path = os.path.join(PROFILE_DIR, name)
+    if not os.path.exists(path):
+        return jsonify({"error": "Unknown profile"}), 404
+    return send_file(path, mimetype="text/plain")
 
 
 if __name__ == "__main__":
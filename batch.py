@@ -0,0 +1,165 @@
+"""Process a directory (or glob) of workbooks without the web UI.
+
+    python batch.py uploads/ --out results/ --workers 4
+    python batch.py "term2/**/*.xlsx" --out results/ --force
+
+For every workbook this writes, under <out>/<name>/ (<name> being its path
+below the inputs' common folder, "/" replaced by "__"): report.json (what the
+dashboard shows), High_Risk_Students.<fmt> and At_Risk_Tracker.<fmt> (--format
+xlsx, csv or parquet), the same files /upload, /export-high-risk and
+/convert-tracker produce. A workbook whose content hash (and format) matches
+the one recorded next to its outputs is skipped unless --force is given.
+Exits 1 if any workbook failed.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import app
+
+HASH_FILE = ".source-sha256"
+
+
+def find_workbooks(inputs: list) -> list:
+    """Workbook paths from directories (recursive) and glob patterns, sorted and de-duplicated."""
+    found = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, "**", "*"), recursive=True)
+        else:
+            matches = glob.glob(item, recursive=True)
+        found.update(os.path.abspath(m) for m in matches
+                     if os.path.isfile(m) and app.allowed_file(m) and not os.path.basename(m).startswith("~$"))
+    return sorted(found)
+
+
+def output_names(paths: list) -> dict:
+    """path -> output folder name: its path below the inputs' common root (extension kept), joined
+    with "__". Raises ValueError if two workbooks would still share a folder (a/b.xlsx, a__b.xlsx)."""
+    if not paths:
+        return {}
+    root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    names = {p: os.path.relpath(p, root).replace(os.sep, "__") for p in paths}
+    clashes = {}
+    for path, name in names.items():
+        clashes.setdefault(name.lower(), []).append(path)
+    clashes = [group for group in clashes.values() if len(group) > 1]
+    if clashes:
+        raise ValueError("workbooks sharing an output folder: " + "; ".join(" vs ".join(g) for g in clashes))
+    return names
+
+
+def _write(path: str, write):
+    """Call write(fh) on a temp file, then move it into place."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as fh:
+        write(fh)
+    os.replace(tmp, path)
+
+
+def process_workbook(path: str, out_dir: str, key: str, fmt: str = "xlsx") -> dict:
+    """Pool entry point: report + exports for one workbook; returns what was written or skipped."""
+    os.makedirs(out_dir, exist_ok=True)
+    df, cleaning_stats = app.load_clean_frame(key, lambda: app.read_upload(path))
+    report = app.build_report(df, cleaning_stats)
+    _write(os.path.join(out_dir, "report.json"), lambda fh: fh.write(json.dumps(report, default=str).encode()))
+    written, skipped = ["report.json"], []
+
+    high_risk = app.high_risk_frame(report)
+    name = f"High_Risk_Students.{fmt}"
+    if high_risk is None:
+        skipped.append(f"{name}: no high-risk students")
+    else:
+        _write(os.path.join(out_dir, name), lambda fh: app.write_export(high_risk, fh, fmt, sheet="High Risk Students"))
+        written.append(name)
+
+    name = f"At_Risk_Tracker.{fmt}"
+    try:
+        tracker = app.transform_to_tracker(df)
+        _write(os.path.join(out_dir, name), lambda fh: app.write_export(tracker, fh, fmt, sheet="Tracker"))
+        written.append(name)
+    except ValueError as e:  # no Student Number / Risk column, or nobody at HIGH risk
+        skipped.append(f"{name}: {e}")
+
+    # recorded last: a matching hash means every output above is complete
+    _write(os.path.join(out_dir, HASH_FILE), lambda fh: fh.write(f"{key} {fmt}".encode()))
+    return {"written": written, "skipped": skipped, "records": report["total_records"]}
+
+
+def unchanged(out_dir: str, key: str, fmt: str) -> bool:
+    try:
+        with open(os.path.join(out_dir, HASH_FILE)) as fh:
+            return fh.read().strip() == f"{key} {fmt}"
+    except OSError:
+        return False
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("inputs", nargs="+", help="directories and/or glob patterns of .xlsx/.xls files")
+    ap.add_argument("--out", required=True, help="output directory")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes (0 = run inline)")
+    ap.add_argument("--format", default="xlsx", choices=sorted(app.EXPORT_FORMATS), help="export file format")
+    ap.add_argument("--force", action="store_true", help="reprocess workbooks whose content is unchanged")
+    args = ap.parse_args()
+
+    paths = find_workbooks(args.inputs)
+    if not paths:
+        sys.exit("no workbooks found")
+    try:
+        names = output_names(paths)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    todo, skipped = [], []
+    for path in paths:
+        key = app.file_hash(path)
+        out_dir = os.path.join(args.out, names[path])
+        if not args.force and unchanged(out_dir, key, args.format):
+            skipped.append(path)
+        else:
+            todo.append((path, out_dir, key))
+    print(f"{len(paths)} workbooks: {len(todo)} to process, {len(skipped)} unchanged", flush=True)
+
+    failures, done, started = {}, 0, time.time()
+
+    def report_progress(path, result=None, error=None):
+        nonlocal done
+        done += 1
+        status = f"FAILED: {error}" if error else f"ok ({result['records']} records)"
+        print(f"[{done}/{len(todo)}] {names[path]}  {status}", flush=True)
+        for note in (result or {}).get("skipped", []):
+            print(f"    skipped {note}", flush=True)
+
+    if args.workers <= 0:
+        for path, out_dir, key in todo:
+            try:
+                report_progress(path, process_workbook(path, out_dir, key, args.format))
+            except Exception as e:
+                failures[path] = str(e)
+                report_progress(path, error=e)
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(process_workbook, path, out_dir, key, args.format): path
+                       for path, out_dir, key in todo}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    report_progress(path, future.result())
+                except Exception as e:
+                    failures[path] = str(e)
+                    report_progress(path, error=e)
+
+    print(f"done in {time.time() - started:.1f}s: {len(todo) - len(failures)} processed, "
+          f"{len(skipped)} unchanged, {len(failures)} failed")
+    for path, error in failures.items():
+        print(f"  FAILED {path}: {error}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Benchmark the analysis pipeline phase by phase on synthetic workbooks.
+
+    python bench.py --rows 10000,100000              # time + peak memory per phase
+    python bench.py --rows 10000,100000 --save       # store as the baseline
+    python bench.py --rows 10000,100000 --check      # exit 1 if a phase regressed
+
+Each phase is timed on its own input (best of --repeat runs), then run once
+more for its peak allocation: tracemalloc for Python/numpy memory plus a 1 ms
+poll of pyarrow's allocator for the Arrow-backed string columns. The clean
+phase's peak must also stay within app.CLEAN_PEAK_RATIO x its input frame.
+Workbooks come from synth.py and are kept in --data-dir so reruns skip
+generation.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from io import BytesIO
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:  # only the tracemalloc part of the peak then
+    pa = None
+
+import app
+import synth
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+def _export_bytes(df: pd.DataFrame, fmt: str, sheet: str) -> int:
+    output = BytesIO()
+    app.write_export(df, output, fmt, sheet=sheet)
+    return output.tell()
+
+
+def phases(path: str) -> tuple:
+    """(name, fn) pairs, each fn closing over the previous phase's output, and the raw frame's size."""
+    raw = app.read_upload(path)
+    clean, stats = app.clean_dataframe(raw)
+    report = app.build_report(clean, stats)
+    tracker = app.transform_to_tracker(clean)
+    high_risk = pd.DataFrame(report["high_risk_students"])
+    return int(raw.memory_usage(deep=True).sum()), [
+        ("parse", lambda: app.read_upload(path)),
+        ("clean", lambda: app.clean_dataframe(raw)),
+        ("build_report", lambda: app.build_report(clean, stats)),
+        ("build_report_streaming", lambda: app.build_report_streaming(path)),
+        ("transform_to_tracker", lambda: app.transform_to_tracker(clean)),
+        ("export_tracker", lambda: _export_bytes(tracker, "xlsx", "Tracker")),
+        ("export_high_risk", lambda: _export_bytes(high_risk, "xlsx", "High Risk Students")),
+        ("export_high_risk_csv", lambda: _export_bytes(high_risk, "csv", "High Risk Students")),
+        ("export_high_risk_parquet", lambda: _export_bytes(high_risk, "parquet", "High Risk Students")),
+    ]
+
+
+def _arrow_peak(fn) -> int:
+    """Run fn, returning the highest Arrow allocation above the starting level (polled)."""
+    if pa is None:
+        fn()
+        return 0
+    start = peak = pa.total_allocated_bytes()
+    done = threading.Event()
+
+    def poll():
+        nonlocal peak
+        while not done.wait(0.001):
+            peak = max(peak, pa.total_allocated_bytes())
+    poller = threading.Thread(target=poll, daemon=True)
+    poller.start()
+    try:
+        fn()
+    finally:
+        done.set()
+        poller.join()
+    return max(peak, pa.total_allocated_bytes()) - start
+
+
+def measure(fn, repeat: int) -> dict:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        arrow = _arrow_peak(fn)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(best, 4), "peak_mb": round((peak + arrow) / 2**20, 2)}
+
+
+def workbook(rows: int, args) -> str:
+    os.makedirs(args.data_dir, exist_ok=True)
+    name = f"synth-{rows}-{args.students or 'auto'}-{args.modules}-{args.skew}-{args.seed}.xlsx"
+    path = os.path.join(args.data_dir, name)
+    if not os.path.exists(path):
+        print(f"generating {name} ...", file=sys.stderr)
+        df = synth.make_frame(rows, args.students, args.modules, skew=args.skew, seed=args.seed)
+        synth.write_workbook(df, path + ".tmp.xlsx")
+        os.replace(path + ".tmp.xlsx", path)
+    return path
+
+
+def regressions(results: dict, baseline: dict, tolerance: float, min_seconds: float) -> list:
+    """Phases slower / bigger than baseline * (1 + tolerance). Sub-min_seconds timings are noise."""
+    out = []
+    for size, phase_results in results.items():
+        for phase, cur in phase_results.items():
+            base = baseline.get(size, {}).get(phase)
+            if not base:
+                continue
+            if cur["seconds"] > max(base["seconds"], min_seconds) * (1 + tolerance):
+                out.append(f"{size} {phase}: {cur['seconds']}s vs baseline {base['seconds']}s")
+            if cur["peak_mb"] > base["peak_mb"] * (1 + tolerance) + 1:
+                out.append(f"{size} {phase}: {cur['peak_mb']} MB vs baseline {base['peak_mb']} MB")
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", default="10000,100000", help="comma-separated row counts (10k .. 1M)")
+    ap.add_argument("--students", type=int, default=None)
+    ap.add_argument("--modules", type=int, default=40)
+    ap.add_argument("--skew", type=float, default=1.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--phases", default="", help="comma-separated subset of phases")
+    ap.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "soit_bench"))
+    ap.add_argument("--baseline", default=BASELINE)
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown / growth (0.25 = 25%%)")
+    ap.add_argument("--min-seconds", type=float, default=0.05)
+    mode = ap.add_mutually_exclusive_group()
+    mode.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    mode.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    args = ap.parse_args()
+
+    wanted = {p for p in args.phases.split(",") if p}
+    results = {}
+    over_budget = []
+    for rows in (int(r) for r in args.rows.split(",") if r):
+        size = f"{rows}"
+        results[size] = {}
+        input_bytes, timed = phases(workbook(rows, args))
+        for name, fn in timed:
+            if wanted and name not in wanted:
+                continue
+            results[size][name] = measure(fn, args.repeat)
+            r = results[size][name]
+            print(f"{size:>8} rows  {name:<24} {r['seconds']:>9.4f}s  {r['peak_mb']:>9.2f} MB")
+        if "clean" in results[size]:
+            ratio = results[size]["clean"]["peak_mb"] * 2**20 / max(input_bytes, 1)
+            print(f"{size:>8} rows  clean peak / input frame  {ratio:.2f}x (limit {app.CLEAN_PEAK_RATIO}x)")
+            if ratio > app.CLEAN_PEAK_RATIO:
+                over_budget.append(f"{size} clean: peak {ratio:.2f}x input, limit {app.CLEAN_PEAK_RATIO}x")
+
+    if args.save:
+        with open(args.baseline, "w") as fh:
+            json.dump(results, fh, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+    elif args.check:
+        if not os.path.exists(args.baseline):
+            sys.exit(f"no baseline at {args.baseline}; run with --save first")
+        with open(args.baseline) as fh:
+            failed = over_budget + regressions(results, json.load(fh), args.tolerance, args.min_seconds)
+        for line in failed:
+            print("REGRESSION", line)
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -150,34 +150,34 @@
   const applyBtn = document.getElementById("applyFilters");
   const resetBtn = document.getElementById("resetFilters");
 
-  function getModuleCounts({ week = "", basis = "all", scope = "all", qual = "" }) {
-    let dataMap = {};
+  // Unfiltered maps come with the page; any week / qualification filter is
+  // answered by the server from aggregates precomputed at upload time.
+  const moduleMapsCache = {};
+  function fetchModuleMaps({ week = "", qual = "" }) {
+    if (!week && !qual) {
+      return Promise.resolve({ all: report.by_module || {}, att: report.by_module_attendance || {} });
+    }
+    const params = new URLSearchParams();
+    if (window.__REPORT_ID__) params.append("report", window.__REPORT_ID__);
+    if (week) params.append("weeks", week);
+    if (qual) params.append("qualifications", qual);
+    const qs = params.toString();
+    if (!moduleMapsCache[qs]) {
+      moduleMapsCache[qs] = fetch(`/api/aggregates?${qs}`, { credentials: "same-origin" })
+        .then(r => (r.ok ? r.json() : {}))
+        .then(d => ({ all: d.by_module || {}, att: d.by_module_attendance || {} }))
+        .catch(() => { delete moduleMapsCache[qs]; return { all: {}, att: {} }; });
+    }
+    return moduleMapsCache[qs];
+  }
 
+  async function getModuleCounts({ week = "", basis = "all", scope = "all", qual = "" }) {
     const isTop = scope.startsWith("top");
     const topN = scope === "top3_att" ? 3 : scope === "top5_att" ? 5 : scope === "top10_att" ? 10 : null;
 
     // choose the right bucket
-    if (basis === "attendance") {
-      if (qual) {
-        dataMap = week
-          ? (report.by_week_module_att_by_qual?.[qual]?.[week] || {})
-          : (report.by_module_att_by_qual?.[qual] || {});
-      } else {
-        dataMap = week
-          ? (report.by_week_module_attendance?.[week] || {})
-          : (report.by_module_attendance || {});
-      }
-    } else {
-      if (qual) {
-        dataMap = week
-          ? (report.by_week_module_all_by_qual?.[qual]?.[week] || {})
-          : (report.by_module_all_by_qual?.[qual] || {});
-      } else {
-        dataMap = week
-          ? (report.by_week_module_all?.[week] || {})
-          : (report.by_module || {});
-      }
-    }
+    const maps = await fetchModuleMaps({ week, qual });
+    const dataMap = basis === "attendance" ? maps.att : maps.all;
 
     let pairs = Object.entries(dataMap).map(([k, v]) => [String(k), Number(v)]);
     pairs.sort((a, b) => b[1] - a[1]);
@@ -185,7 +185,7 @@
     return { labels: pairs.map(p => p[0]), values: pairs.map(p => p[1]) };
   }
 
-  function renderModuleChart() {
+  async function renderModuleChart() {
     const wrap = document.getElementById("moduleChartWrap");
     const ctx  = document.getElementById("moduleChart");
     if (!wrap || !ctx) return;
@@ -194,8 +194,9 @@
     const basis = basisSel?.value || "all";
     const qual  = qualSel?.value || "";
 
-    const { labels, values } = getModuleCounts({ week, basis, scope, qual });
+    const { labels, values } = await getModuleCounts({ week, basis, scope, qual });
     if (!labels.length) { hideCardByCanvas("moduleChart"); return; }
+    ctx.closest(".card")?.classList.remove("hidden");  // an earlier filter may have emptied it
     setDynamicHeight(wrap, labels.length);
     moduleChart?.destroy();
     moduleChart = makeBar(ctx, labels, values, true);
@@ -223,18 +224,37 @@
     const topStudentList = document.getElementById("topStudentList");
     const studentSelectedNote = document.getElementById("studentSelectedNote");
 
-    // Maps
-    const labelToId = {};
+    // Maps (filled from typeahead matches and top lists as they arrive)
     const idToLabel = {};
     const idToQual  = {};
-    (report.student_lookup || []).forEach(s => {
-      labelToId[s.label] = s.id; idToLabel[s.id] = s.label; idToQual[s.id] = s.qual || "";
+    function remember(list) {
+      rememberStudents(list);
+      (list || []).forEach(s => { idToLabel[s.id] = s.label; idToQual[s.id] = s.qual || ""; });
+    }
+
+    // Typeahead: the datalist only ever holds the current top matches
+    const studentsList = document.getElementById("studentsList");
+    let typeaheadTimer = null, typeaheadSeq = 0;
+    studentSearch?.addEventListener("input", () => {
+      clearTimeout(typeaheadTimer);
+      const q = studentSearch.value;
+      if (studentByLabel(q)) return;  // a suggestion was just picked
+      typeaheadTimer = setTimeout(async () => {
+        const seq = ++typeaheadSeq;
+        const matches = await searchStudents(q);
+        if (seq !== typeaheadSeq) return;  // a newer keystroke won
+        remember(matches);
+        studentsList?.replaceChildren(...matches.map(s => {
+          const o = document.createElement("option"); o.value = s.label; return o;
+        }));
+      }, 150);
     });
 
     // charts
     let stuModAttChart, stuWeekAttChart, stuWeekRiskChart;
 
-    function renderTopList() {
+    async function renderTopList() {
+      await reportSection("top_students");
       const mod = topModuleSelect?.value || "";
       const qual= topQualSelect?.value || "";
       const n = parseInt(topNStudent?.value || "10", 10) || 10;
@@ -251,6 +271,7 @@
       }
 
       if (!list.length) { topStudentList.innerHTML = "<em>No data for the selection.</em>"; return; }
+      remember(list);
 
       topStudentList.innerHTML = list.map(x =>
         `<button class="btn btn-outline" data-sid="${x.id}" data-label="${x.label}" style="margin:4px 6px 0 0;">${x.label} (${x.count})</button>`
@@ -264,12 +285,13 @@
       });
     }
 
-    function analyzeStudent(sid) {
+    async function analyzeStudent(sid) {
       if (!sid) {
         const typed = studentSearch?.value || "";
-        sid = labelToId[typed] || normalizeId(typed);
+        sid = studentByLabel(typed)?.id || normalizeId(typed);
       }
       if (!sid) { studentSelectedNote.textContent = "Pick a student."; return; }
+      await reportStudent(sid);
 
       const qual = idToQual[sid] || "";
       studentSelectedNote.textContent = `Selected: ${idToLabel[sid] || sid}${qual ? " · Qualification: " + qual : ""}`;
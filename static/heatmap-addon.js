@@ -47,13 +47,14 @@
     items.sort((a, b) => a.n - b.n || a.w.localeCompare(b.w));
     return items.map(x => x.w);
   }
-  const labelToId = {};
-  (report.student_lookup || []).forEach(s => {
-    if (s && s.label) labelToId[s.label] = s.id || normalizeId(s.label);
-  });
+  // heatmap capacities arrive as a lazy report section, students via the
+  // typeahead (see report-sections.js)
+  function loadSections() {
+    return reportSection("heatmap");
+  }
   function sidFromInput() {
     const typed = studentSearch?.value || "";
-    return labelToId[typed] || normalizeId(typed);
+    return studentByLabel(typed)?.id || normalizeId(typed);
   }
 
   // ---- options fill ----
@@ -175,7 +176,8 @@
     if (band === "high") return r >= 70;
     return true;
   }
-  function topStudentsData() {
+  async function topStudentsData() {
+    await reportSection("top_students");
     const base = (report.global_top_students_att || []).slice();
     const mod = topModuleSelect?.value || "";
     if (mod) {
@@ -186,14 +188,14 @@
     }
     return base;
   }
-  function renderTopList() {
+  async function renderTopList() {
     if (!topStudentList) return;
     const n = parseInt(topNStudent?.value || "10", 10);
     const basis = topBasis?.value || "count";
     const band = rateBand?.value || "";
     const qual = (topQualSelect?.value || "").trim();
 
-    let arr = topStudentsData();
+    let arr = await topStudentsData();
     if (qual) {
       const rx = new RegExp(`\\[${qual.replace(/[.*+?^${}()|[\\]\\\\]/g, "\\$&")}\\]`);
       arr = arr.filter(x => (x.qual && x.qual === qual) || rx.test(x.label || ""));
@@ -205,6 +207,7 @@
       return bv - av;
     });
     arr = arr.slice(0, n);
+    rememberStudents(arr);
 
     if (!arr.length) {
       topStudentList.innerHTML = "<em>No data for the selection.</em>";
@@ -229,13 +232,16 @@
   }
 
   // ---- analyze student ----
-  function analyzeStudent(sid, autoRender = true) {
+  async function analyzeStudent(sid, autoRender = true) {
+    await loadSections();
     if (!sid) sid = sidFromInput();
     if (!sid) {
       studentSelectedNote.textContent = "Pick a student.";
       return;
     }
-    const picked = (report.student_lookup || []).find(x => x.id === sid);
+    await reportStudent(sid);
+    const typed = studentByLabel(studentSearch?.value || "");
+    const picked = typed && typed.id === sid ? typed : null;
     studentSelectedNote.textContent = picked ? `Selected: ${picked.label}` : `Selected: ${sid}`;
 
     renderStudentModuleSummary(sid);
@@ -261,20 +267,24 @@
   analyzeStudentBtn?.addEventListener("click", (e) => { e.preventDefault(); analyzeStudent(); });
 
   // legacy single render
-  renderStudentHeatmapBtn?.addEventListener("click", (e) => {
+  renderStudentHeatmapBtn?.addEventListener("click", async (e) => {
     e.preventDefault();
+    await loadSections();
     const sid = sidFromInput();
     if (!sid) { studentSelectedNote.textContent = "Pick a student first."; return; }
+    await reportStudent(sid);
     const mod = stuModuleForHeatmap.value || "";
     if (!mod) { stuHeatmapWrap.innerHTML = `<p class="muted tiny">Pick a module.</p>`; return; }
     renderStudentHeatmapRows(sid, [mod]);
   });
 
   // inline multi render
-  hmRender?.addEventListener("click", (e) => {
+  hmRender?.addEventListener("click", async (e) => {
     e.preventDefault();
+    await loadSections();
     const sid = sidFromInput();
     if (!sid) { studentSelectedNote.textContent = "Pick a student first."; return; }
+    await reportStudent(sid);
 
     const sel = Array.from(hmModule?.selectedOptions || []).map(o => o.value);
     let modules = sel;
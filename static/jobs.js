@@ -0,0 +1,49 @@
+(function () {
+  // Follow an upload / conversion job (server-sent events, polling as the
+  // fallback) and move on to the dashboard or the download when it's done.
+  const card = document.getElementById("jobCard");
+  if (!card) return;
+  const jobId = card.dataset.jobId;
+  const kind = card.dataset.jobKind;
+  const bar = document.getElementById("jobProgress");
+  const status = document.getElementById("jobStatus");
+  const PHASES = {
+    queued: "Queued", parsing: "Reading workbook", analysing: "Building report",
+    transforming: "Building tracker", writing: "Writing workbook", caching: "Saving results", done: "Done",
+  };
+
+  let finished = false;
+  function show(job) {
+    if (finished || !job) return;
+    if (bar) bar.value = Number(job.progress || 0);
+    if (status) status.textContent = PHASES[job.phase] || job.phase || "";
+    if (job.status === "error") {
+      finished = true;
+      if (status) status.textContent = job.error || "Processing failed.";
+      card.classList.add("alert", "alert--error");
+    } else if (job.status === "done") {
+      finished = true;
+      if (kind === "tracker") {
+        if (status) status.innerHTML = `Done. <a href="/jobs/${jobId}/download">Download the tracker</a> if it didn't start.`;
+        window.location.href = `/jobs/${jobId}/download`;
+      } else {
+        window.location.href = `/report/${job.report_id}`;
+      }
+    }
+  }
+
+  function poll() {
+    fetch(`/jobs/${jobId}`, { credentials: "same-origin" })
+      .then(r => (r.ok ? r.json() : null))
+      .then(job => { show(job); if (!finished) setTimeout(poll, 1000); })
+      .catch(() => setTimeout(poll, 2000));
+  }
+
+  if (window.EventSource) {
+    const es = new EventSource(`/jobs/${jobId}/events`);
+    es.onmessage = (e) => { show(JSON.parse(e.data)); if (finished) es.close(); };
+    es.onerror = () => { es.close(); if (!finished) poll(); };
+  } else {
+    poll();
+  }
+})();
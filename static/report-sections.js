@@ -0,0 +1,62 @@
+(function () {
+  // Lazy report sections: the page inlines only the summary; per-student
+  // sections are fetched once from /report/<id>/<section> and merged into
+  // window.__REPORT__ so existing `report.xxx` reads keep working.
+  const pending = {};
+
+  window.reportSection = function (name) {
+    const report = window.__REPORT__ || {};
+    const id = window.__REPORT_ID__;
+    if (!id) return Promise.resolve(report);
+    if (!pending[name]) {
+      pending[name] = fetch(`/report/${id}/${name}`, { credentials: "same-origin" })
+        .then(r => (r.ok ? r.json() : {}))
+        .then(data => Object.assign(report, data))
+        .catch(() => { delete pending[name]; return report; });
+    }
+    return pending[name];
+  };
+
+  // One student's drill-down from /student/<sid>, merged in as report.ps_xxx[sid].
+  const students = {};
+  window.reportStudent = function (sid) {
+    const report = window.__REPORT__ || {};
+    const id = window.__REPORT_ID__;
+    if (!id || !sid) return Promise.resolve(report);
+    if (!students[sid]) {
+      students[sid] = fetch(`/student/${encodeURIComponent(sid)}?report=${id}`, { credentials: "same-origin" })
+        .then(r => (r.ok ? r.json() : {}))
+        .then(view => {
+          Object.keys(view).filter(k => k !== "id").forEach(k => {
+            report[k] = report[k] || {};
+            report[k][sid] = view[k];
+          });
+          return report;
+        })
+        .catch(() => { delete students[sid]; return report; });
+    }
+    return students[sid];
+  };
+
+  // Typeahead: top-k matches from /api/students/search, remembered by label
+  // so a picked suggestion resolves to its student id.
+  const byLabel = {};
+  window.searchStudents = function (q, k = 10) {
+    const id = window.__REPORT_ID__;
+    if (!id || !String(q || "").trim()) return Promise.resolve([]);
+    return fetch(`/api/students/search?report=${id}&k=${k}&q=${encodeURIComponent(q)}`, { credentials: "same-origin" })
+      .then(r => (r.ok ? r.json() : {}))
+      .then(d => {
+        const matches = d.matches || [];
+        matches.forEach(s => { byLabel[s.label] = s; });
+        return matches;
+      })
+      .catch(() => []);
+  };
+  window.rememberStudents = function (list) {
+    (list || []).forEach(s => { if (s && s.label) byLabel[s.label] = s; });
+  };
+  window.studentByLabel = function (label) {
+    return byLabel[label] || null;
+  };
+})();
@@ -0,0 +1,104 @@
+"""Deterministic synthetic attendance workbooks for benchmarking the pipeline.
+
+    python synth.py out.xlsx --rows 100000 --students 5000 --skew 1.1
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+COLUMNS = [
+    "Student Number", "Student Name", "Module", "Week", "Reason", "Risk",
+    "Intervention", "Qualification", "Year Registered", "Notes",
+]
+
+# real reason codes as they appear in the source sheets (weighted)
+REASONS = [
+    ("Class Attendance_001", 0.45),
+    ("Canvas Activity_007", 0.25),
+    ("Non-Participation in Formal Assessment_006", 0.12),
+    ("Poor Participation in Formal Assessment_006", 0.10),
+    ("Absent from lab", 0.05),
+    ("Other", 0.03),
+]
+RISKS = [("High", 0.3), ("Moderate", 0.4), ("Low", 0.3)]
+INTERVENTIONS = [("", 0.5), ("Emailed student", 0.3), ("Called student", 0.15), ("Met with lecturer", 0.05)]
+QUALIFICATIONS = ["BBIS", "BITW", "HCS-B", "DIP", "BCOM", "BSCIT", "HCIT", "BIT"]
+FIRST = ["Thabo", "Lerato", "Sipho", "Naledi", "Kagiso", "Zanele", "Pieter", "Anika", "Musa", "Ayesha"]
+LAST = ["Mokoena", "Naidoo", "Dlamini", "van Wyk", "Botha", "Khumalo", "Pillay", "Smith", "Nkosi", "Daniels"]
+
+
+def _weighted(rng, pairs, n):
+    labels, weights = zip(*pairs)
+    p = np.asarray(weights, dtype=float)
+    return np.asarray(labels, dtype=object)[rng.choice(len(labels), size=n, p=p / p.sum())]
+
+
+def _zipf_codes(rng, cardinality: int, n: int, skew: float) -> np.ndarray:
+    """n draws over range(cardinality); skew=0 is uniform, larger puts more rows on fewer codes."""
+    p = 1.0 / np.arange(1, cardinality + 1) ** skew
+    codes = rng.choice(cardinality, size=n, p=p / p.sum())
+    return rng.permutation(cardinality)[codes]  # popular codes are not simply the lowest ids
+
+
+def make_frame(rows: int = 10_000, students: int = None, modules: int = 40, weeks: int = 14,
+               skew: float = 1.0, seed: int = 0) -> pd.DataFrame:
+    """Synthetic sheet with the real column layout; same arguments, same frame."""
+    rng = np.random.default_rng(seed)
+    students = students or max(1, rows // 20)
+
+    # per-student attributes, so a student keeps one name / qualification / year
+    ids = 200_000_000 + rng.choice(900_000, size=students, replace=False)
+    names = (np.asarray(FIRST, dtype=object)[rng.integers(len(FIRST), size=students)] + " "
+             + np.asarray(LAST, dtype=object)[rng.integers(len(LAST), size=students)])
+    quals = np.asarray(QUALIFICATIONS, dtype=object)[rng.integers(len(QUALIFICATIONS), size=students)]
+    years = np.asarray(["2022", "2023", "2024", "2025"], dtype=object)[rng.integers(4, size=students)]
+
+    stu = _zipf_codes(rng, students, rows, skew)
+    mod = _zipf_codes(rng, modules, rows, skew / 2)
+    module_names = np.asarray([f"{p}{100 + i}" for i, p in
+                               zip(range(modules), np.resize(["ITM", "PRG", "DBS", "NET", "WEB", "SEC"], modules))],
+                              dtype=object)
+
+    return pd.DataFrame({
+        "Student Number": ids[stu],
+        "Student Name": names[stu],
+        "Module": module_names[mod],
+        "Week": np.char.add("Week ", (rng.integers(weeks, size=rows) + 1).astype(str)).astype(object),
+        "Reason": _weighted(rng, REASONS, rows),
+        "Risk": _weighted(rng, RISKS, rows),
+        "Intervention": _weighted(rng, INTERVENTIONS, rows),
+        "Qualification": quals[stu],
+        "Year Registered": years[stu],
+        "Notes": np.where(rng.random(rows) < 0.1, "Follow up", ""),
+    }, columns=COLUMNS)
+
+
+def write_workbook(df: pd.DataFrame, path: str):
+    """Write df as a single-sheet .xlsx without holding the sheet in memory (fine for 1M rows)."""
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(list(df.columns))
+    for row in df.itertuples(index=False, name=None):
+        ws.append([None if v == "" else v for v in row])
+    wb.save(path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("path")
+    ap.add_argument("--rows", type=int, default=10_000)
+    ap.add_argument("--students", type=int, default=None, help="distinct students (default rows/20)")
+    ap.add_argument("--modules", type=int, default=40)
+    ap.add_argument("--weeks", type=int, default=14)
+    ap.add_argument("--skew", type=float, default=1.0, help="Zipf exponent of rows per student (0 = uniform)")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    df = make_frame(args.rows, args.students, args.modules, args.weeks, args.skew, args.seed)
+    write_workbook(df, args.path)
+    print(f"wrote {len(df)} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
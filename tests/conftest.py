@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# app reads its cache / store locations at import: keep every test run's files
+# in one throwaway directory and run jobs inline
+_tmp = tempfile.mkdtemp(prefix="soit_tests_")
+for name in ("REPORT_CACHE_DIR", "SNAPSHOT_DIR", "JOB_DIR", "UPLOAD_DIR", "PROFILE_DIR"):
+    os.environ[name] = os.path.join(_tmp, name.lower())
+os.environ["ANALYTICS_DB"] = os.path.join(_tmp, "analytics.sqlite3")
+os.environ["UPLOAD_WORKERS"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
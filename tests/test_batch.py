@@ -0,0 +1,17 @@
+"""batch.py output folder naming."""
+import pytest
+
+import batch
+
+
+def test_extension_is_part_of_the_folder(tmp_path):
+    a, b = str(tmp_path / "a" / "x.xlsx"), str(tmp_path / "a" / "x.xls")
+    c = str(tmp_path / "b" / "x.xlsx")
+    names = batch.output_names([a, b, c])
+    assert names == {a: "a__x.xlsx", b: "a__x.xls", c: "b__x.xlsx"}
+
+
+def test_colliding_folders_are_refused(tmp_path):
+    nested, flat = str(tmp_path / "a" / "b.xlsx"), str(tmp_path / "a__b.xlsx")
+    with pytest.raises(ValueError, match="a__b.xlsx"):
+        batch.output_names([nested, flat])
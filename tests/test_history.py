@@ -0,0 +1,89 @@
+"""The analytics store counts every sheet of a term; only a newer version of the same sheet replaces weeks."""
+import pytest
+
+import app
+import synth
+
+
+def _cube(df):
+    clean, stats = app.clean_dataframe(df)
+    cubes = []
+    app.build_report(clean, stats, on_cube=cubes.append)
+    return cubes[0]
+
+
+@pytest.fixture(scope="module")
+def cubes():
+    a, b = synth.make_frame(1500, seed=31), synth.make_frame(900, seed=32)
+    weeks = a["Week"].str.extract(r"(\d+)", expand=False).astype(int)
+    return {"a_w7": _cube(a[weeks <= 7]), "a": _cube(a), "b": _cube(b)}
+
+
+def _records(store, term="T1"):
+    return int(store.cube(term)["_n"].sum())
+
+
+def _n(cube):
+    return int(cube["_n"].sum())
+
+
+def test_different_sheets_in_a_term_all_count(tmp_path, cubes):
+    store = app.AnalyticsStore(str(tmp_path / "h.sqlite3"))
+    store.ingest("k1", cubes["a_w7"], "T1", "a.xlsx")
+    store.ingest("k2", cubes["b"], "T1", "b.xlsx")
+    assert _records(store) == _n(cubes["a_w7"]) + _n(cubes["b"])
+
+
+def test_a_sheet_replaces_its_own_weeks(tmp_path, cubes):
+    store = app.AnalyticsStore(str(tmp_path / "h.sqlite3"))
+    store.ingest("k1", cubes["a_w7"], "T1", "a.xlsx")
+    store.ingest("k2", cubes["b"], "T1", "b.xlsx")
+    store.ingest("k3", cubes["a"], "T1", "a.xlsx")   # same sheet, grown by a few weeks
+    assert _records(store) == _n(cubes["a"]) + _n(cubes["b"])
+
+
+def test_supersedes_links_a_renamed_sheet(tmp_path, cubes):
+    store = app.AnalyticsStore(str(tmp_path / "h.sqlite3"))
+    store.ingest("k1", cubes["a_w7"], "T1", "a_week7.xlsx")
+    store.ingest("k2", cubes["a"], "T1", "a_week14.xlsx")
+    assert _records(store) == _n(cubes["a_w7"]) + _n(cubes["a"])   # unlinked: two sheets
+    store.ingest("k3", cubes["a"], "T2", "a_week7.xlsx")
+    store.ingest("k4", cubes["a_w7"], "T2", "a_week14.xlsx", supersedes="a_week7.xlsx")
+    store.ingest("k5", cubes["a"], "T2", "a_week21.xlsx", supersedes="k4")
+    assert _records(store, "T2") == _n(cubes["a"])
+    assert {u["source"] for u in store.uploads() if u["term"] == "T2"} == {"a_week7.xlsx"}
+
+
+
+def test_ingest_prunes_old_uploads(tmp_path, cubes):
+    store = app.AnalyticsStore(str(tmp_path / "h.sqlite3"), max_uploads=2)
+    store.ingest("k1", cubes["a_w7"], "T1", "a.xlsx")
+    store.ingest("k2", cubes["b"], "T1", "b.xlsx")
+    store.ingest("k3", cubes["a"], "T2", "a.xlsx")
+    assert [u["term"] for u in store.uploads()] == ["T1", "T2"]
+    assert _records(store, "T1") == _n(cubes["b"])
+    assert store._conn().execute("SELECT COUNT(*) FROM facts WHERE upload NOT IN (SELECT id FROM uploads)").fetchone()[0] == 0
+
+    # past the age limit everything but the upload being ingested goes
+    store.ttl = 1
+    store._conn().execute("UPDATE uploads SET ingested = ingested - 10")
+    store.ingest("k4", cubes["b"], "T3", "b.xlsx")
+    assert [u["term"] for u in store.uploads()] == ["T3"]
+
+
+def test_history_routes_need_the_token(tmp_path, cubes, monkeypatch):
+    store = app.AnalyticsStore(str(tmp_path / "h.sqlite3"))
+    store.ingest("f" * 64, cubes["b"], "T1", "b.xlsx")
+    monkeypatch.setattr(app, "analytics_store", store)
+    client = app.app.test_client()
+    sid = str(cubes["b"]["student"].dropna().iloc[0])
+    urls = ["/api/history/uploads", "/api/history/aggregates?term=T1", f"/api/history/student/{sid}"]
+
+    monkeypatch.setattr(app, "ANALYTICS_TOKEN", "")
+    assert [client.get(u).status_code for u in urls] == [404] * 3
+    monkeypatch.setattr(app, "ANALYTICS_TOKEN", "s3cret")
+    assert [client.get(u).status_code for u in urls] == [401] * 3
+    assert [client.get(u, headers={"Authorization": "Bearer wrong"}).status_code for u in urls] == [401] * 3
+    resp = [client.get(u, headers={"Authorization": "Bearer s3cret"}) for u in urls]
+    assert [r.status_code for r in resp] == [200] * 3
+    assert "f" * 64 not in resp[0].get_data(as_text=True)   # no report ids
@@ -0,0 +1,70 @@
+"""A re-upload that only appends rows resumes from the earlier version and still equals a full rebuild."""
+import json
+
+import pytest
+
+import app
+import synth
+
+
+def _weekly(seed=41):
+    df = synth.make_frame(1200, students=120, weeks=12, seed=seed)
+    week = df["Week"].str.extract(r"(\d+)", expand=False).astype(int)
+    order = week.sort_values(kind="stable").index
+    return df.loc[order].reset_index(drop=True), week.loc[order].reset_index(drop=True)
+
+
+def _full(path):
+    return app.build_report(app.read_upload(path), sample=app.read_preview(path))
+
+
+def _same(a, b):
+    return json.dumps(a, default=str) == json.dumps(b, default=str)
+
+
+@pytest.fixture
+def folded_rows(monkeypatch):
+    """Rows folded into a ReportAccumulator since the count was last reset."""
+    count = [0]
+    add = app.ReportAccumulator.add
+
+    def counting(self, chunk, cleaning_stats=None):
+        count[0] += len(chunk)
+        return add(self, chunk, cleaning_stats)
+    monkeypatch.setattr(app.ReportAccumulator, "add", counting)
+    monkeypatch.setattr(app, "INCREMENTAL_HEAD_ROWS", 100)
+    return count
+
+
+def test_appended_weeks_fold_only_the_new_rows(tmp_path, folded_rows):
+    df, week = _weekly()
+    last = 0
+    for upto in (4, 8, 12):
+        path = str(tmp_path / f"week{upto}.xlsx")
+        synth.write_workbook(df[week <= upto], path)
+        folded_rows[0] = 0
+        report = app.build_report_incremental(path, app.file_hash(path), chunk_rows=97)
+        rows = int((week <= upto).sum())
+        assert folded_rows[0] == rows - last   # only the rows after the earlier version
+        assert _same(report, _full(path))
+        last = rows
+
+    # the extended snapshot rebuilds the same report
+    assert _same(app.build_report_from_snapshot(app.file_hash(path)), _full(path))
+
+
+def test_edited_earlier_row_falls_back_to_a_full_rebuild(tmp_path, folded_rows):
+    df, week = _weekly(seed=42)
+    first = str(tmp_path / "first.xlsx")
+    synth.write_workbook(df[week <= 6], first)
+    app.build_report_incremental(first, app.file_hash(first))
+
+    edited = df.copy()
+    edited.loc[500, "Risk"] = "Edited"   # past the head, inside the earlier version
+    assert 100 < 500 < int((week <= 6).sum())
+    second = str(tmp_path / "second.xlsx")
+    synth.write_workbook(edited, second)
+    folded_rows[0] = 0
+    report = app.build_report_incremental(second, app.file_hash(second))
+    assert folded_rows[0] == len(df)
+    assert _same(report, _full(second))
@@ -0,0 +1,59 @@
+"""Job slots are shared across processes; job event streams are short and capped;
+pool processes keep no cache in memory."""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import app
+import synth
+
+
+def _hold_slot(seconds):
+    with app._job_slot():
+        start = time.time()
+        time.sleep(seconds)
+        return start, time.time()
+
+
+def test_job_slots_are_shared_across_processes():
+    with ProcessPoolExecutor(3, mp_context=multiprocessing.get_context("spawn")) as pool:
+        spans = sorted(pool.map(_hold_slot, [0.3] * 3))
+    # JOB_SLOTS=1: no two processes ran inside a slot at the same time
+    assert all(later[0] >= earlier[1] for earlier, later in zip(spans, spans[1:]))
+
+
+def test_event_stream_ends_and_is_capped(monkeypatch):
+    monkeypatch.setattr(app, "JOB_EVENTS_SECONDS", 0.3)
+    job = app._write_job("ab" * 16, id="ab" * 16, kind="report", status="running", phase="parsing", progress=0.1)
+    client = app.app.test_client()
+
+    t0 = time.time()
+    body = client.get(f"/jobs/{job['id']}/events").get_data(as_text=True)
+    assert body.count("data: ") == 1 and time.time() - t0 < 5   # ended although the job still runs
+
+    for _ in range(app.JOB_EVENTS_STREAMS):
+        assert app._event_streams.acquire(blocking=False)
+    try:
+        assert client.get(f"/jobs/{job['id']}/events").get_data(as_text=True) == ""   # refused: client polls
+    finally:
+        for _ in range(app.JOB_EVENTS_STREAMS):
+            app._event_streams.release()
+
+
+def _report_job(path):
+    key = app.file_hash(path)
+    job_id = "cd" * 16
+    app.run_report_job(job_id, key, path)
+    caches = (app.report_cache, app.filter_cache, app.student_cache)
+    return (app.read_job(job_id)["status"], [c._mem_bytes for c in caches], len(app._live_student_index),
+            [os.path.exists(c._path(key)) for c in caches])
+
+
+def test_pool_processes_write_the_disk_tier_only(tmp_path):
+    path = str(tmp_path / "pool.xlsx")
+    synth.write_workbook(synth.make_frame(400, seed=41), path)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=ctx, initializer=app._init_job_process) as pool:
+        status, mem, live, on_disk = pool.submit(_report_job, path).result()
+    assert status == "done" and mem == [0, 0, 0] and live == 0 and all(on_disk)
@@ -0,0 +1,42 @@
+"""Compute locks are per key, serialise one key across processes and clean up after themselves."""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import app
+
+KEY = "ab" + "0" * 62
+
+
+def _hold(key, seconds):
+    with app.compute_lock(key):
+        start = time.time()
+        time.sleep(seconds)
+        return start, time.time()
+
+
+def test_same_key_is_serialised_across_processes():
+    with ProcessPoolExecutor(3, mp_context=multiprocessing.get_context("spawn")) as pool:
+        spans = sorted(pool.map(_hold, [KEY] * 3, [0.3] * 3))
+    assert all(later[0] >= earlier[1] for earlier, later in zip(spans, spans[1:]))
+    assert not os.listdir(app.COMPUTE_LOCK_DIR)   # the last holder removed the file
+
+
+def test_keys_sharing_a_prefix_do_not_block_each_other(monkeypatch):
+    monkeypatch.setattr(app, "COMPUTE_LOCK_TIMEOUT", 2)
+    t0 = time.time()
+    with app.compute_lock(KEY):
+        with app.compute_lock("ab" + "1" * 62):
+            pass
+    assert time.time() - t0 < 1
+
+
+def test_stale_lock_files_are_pruned():
+    os.makedirs(app.COMPUTE_LOCK_DIR, exist_ok=True)
+    stale = os.path.join(app.COMPUTE_LOCK_DIR, "cd" * 32 + ".lock")
+    open(stale, "a").close()
+    os.utime(stale, (0, 0))
+    with app.compute_lock(KEY):
+        pass
+    assert not os.listdir(app.COMPUTE_LOCK_DIR)
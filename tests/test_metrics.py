@@ -0,0 +1,47 @@
+"""Traced phases only report a memory peak when nothing else ran beside them."""
+import threading
+import tracemalloc
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def tracing():
+    tracemalloc.start()
+    try:
+        yield
+    finally:
+        tracemalloc.stop()
+
+
+def test_lone_phase_gets_its_peak(tracing):
+    with app.collect_phases() as phases:
+        with app.timed("alloc"):
+            block = bytearray(8 * 2**20)
+            del block
+    assert phases[0]["peak_mb"] >= 8
+
+
+def test_overlapping_phases_get_no_peak(tracing):
+    inside, release = threading.Event(), threading.Event()
+
+    def other():
+        with app.collect_phases() as phases:
+            with app.timed("other"):
+                inside.set()
+                release.wait(5)
+        logs.append(phases)
+
+    logs = []
+    t = threading.Thread(target=other)
+    t.start()
+    inside.wait(5)
+    with app.collect_phases() as phases:
+        with app.timed("mine"):
+            bytearray(2**20)
+    release.set()
+    t.join()
+    assert [p["name"] for p in phases + logs[0]] == ["mine", "other"]
+    assert all("peak_mb" not in p and "ms" in p for p in phases + logs[0])
@@ -0,0 +1,58 @@
+"""build_report invariants."""
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+import synth
+
+
+@pytest.mark.parametrize("seed,skew", [(0, 1.0), (1, 0.0), (2, 1.6)])
+def test_parallel_sections_match_serial(seed, skew):
+    df = synth.make_frame(3000, students=300, skew=skew, seed=seed)
+    clean, stats = app.clean_dataframe(df)
+    serial = app.build_report(clean, stats, parallel=False)
+    parallel = app.build_report(clean, stats, parallel=True)
+    assert list(parallel) == list(serial)
+    assert json.dumps(parallel, default=str) == json.dumps(serial, default=str)
+
+
+def test_normalize_text_keeps_missing_cells_missing():
+    s = pd.Series([" a ", None, np.nan, 3, "", "  ", pd.NA], dtype=object)
+    out = app._normalize_text(s)
+    assert out.notna().tolist() == [True, False, False, True, False, False, False]
+    assert out[out.notna()].tolist() == ["a", "3"]
+
+
+@pytest.mark.parametrize("rows,chunk_rows", [(3000, 5000), (3000, 97), (200, 1)])
+def test_streaming_matches_full_read(tmp_path, monkeypatch, rows, chunk_rows):
+    path = str(tmp_path / "upload.xlsx")
+    df = synth.make_frame(rows, students=max(rows // 10, 5), seed=rows + chunk_rows)
+    synth.write_workbook(df.assign(Campus="North"), path)  # a column no report role reads
+    full = app.build_report(app.read_upload(path), sample=app.read_preview(path))
+    key = f"stream-{rows}-{chunk_rows}"
+    streamed = app.build_report_streaming(path, chunk_rows, key=key)
+    assert json.dumps(streamed, default=str) == json.dumps(full, default=str)
+
+    # the streamed chunks became the upload's snapshot, and rebuilding from it agrees too
+    df, stats = app.load_snapshot(key)
+    assert len(df) == rows and stats == full["cleaning_stats"]
+    monkeypatch.setattr(app, "STREAM_CHUNK_ROWS", chunk_rows)
+    rebuilt = app.build_report_from_snapshot(key)
+    assert json.dumps(rebuilt, default=str) == json.dumps(full, default=str)
+
+
+def test_preview_keeps_unanalysed_columns(tmp_path):
+    path = str(tmp_path / "upload.xlsx")
+    df = synth.make_frame(300, students=30, seed=7)
+    synth.write_workbook(df.assign(Campus="North"), path)
+    report = app.build_report(app.read_upload(path), sample=app.read_preview(path))
+    assert "Campus" not in app.read_upload(path).columns
+    assert len(report["sample_rows"]) == 50 and report["sample_rows"][0]["Campus"] == "North"
+
+    # the preview only changes the sample rows
+    plain = app.build_report(app.read_upload(path))
+    assert "Campus" not in plain["sample_rows"][0]
+    assert {k: v for k, v in report.items() if k != "sample_rows"} == {k: v for k, v in plain.items() if k != "sample_rows"}
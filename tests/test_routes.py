@@ -0,0 +1,43 @@
+"""Routes that take ?report=<id> answer for that report, not whichever upload the session holds."""
+import io
+
+import pytest
+
+import app
+import synth
+
+
+def _upload(client, df, name):
+    buf = io.BytesIO()
+    synth.write_workbook(df, buf)
+    buf.seek(0)
+    resp = client.post("/upload", data={"file": (buf, name)}, content_type="multipart/form-data")
+    assert resp.status_code == 200
+    with client.session_transaction() as sess:
+        return sess["upload_hash"]
+
+
+@pytest.fixture(scope="module")
+def two_uploads():
+    client = app.app.test_client()
+    a = _upload(client, synth.make_frame(800, seed=21), "a.xlsx")
+    b = _upload(client, synth.make_frame(500, seed=22), "b.xlsx")   # the session now points at b
+    return client, a, b
+
+
+def test_aggregates_follow_report_param(two_uploads):
+    client, a, b = two_uploads
+    week = "Week 3"
+    got = {}
+    for report_id in (a, b):
+        got[report_id] = client.get(f"/api/aggregates?report={report_id}&weeks={week}").get_json()["by_module"]
+        assert got[report_id] == app.filter_cache.get(report_id).aggregates(weeks=[week])["by_module"]
+    assert got[a] != got[b]
+    assert (client.get(f"/api/aggregates?weeks={week}").get_json()["by_module"]
+            == app.filter_cache.get(b).aggregates(weeks=[week])["by_module"])
+
+
+def test_aggregates_unknown_report(two_uploads):
+    client, _, _ = two_uploads
+    assert client.get("/api/aggregates?report=" + "0" * 64).status_code == 404
+    assert client.get("/api/aggregates?report=nope").status_code == 404
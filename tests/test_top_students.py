@@ -0,0 +1,45 @@
+"""Top-student lists stay correct under the UI's qualification / rate-band filters."""
+import json
+
+import pytest
+
+import app
+import synth
+
+
+def _in_band(rate, band):
+    if not band:
+        return True
+    return {"low": rate <= 39, "moderate": 40 <= rate <= 69, "high": rate >= 70}[band]
+
+
+def _shown(entries, qual, band, basis, n=20):
+    """What heatmap-addon.js renderTopList shows: filter, stable sort by basis, take n."""
+    arr = [x for x in entries if not qual or x["qual"] == qual or f"[{qual}]" in x["label"]]
+    arr = [x for x in arr if _in_band(x["rate"], band)]
+    return sorted(arr, key=lambda x: -(x["rate"] if basis == "rate" else x["count"]))[:n]
+
+
+@pytest.fixture(scope="module")
+def reports():
+    df = synth.make_frame(6000, students=600, seed=5)
+    full = app.build_report(df.copy(), top_n=10**9)   # no cut: the full ranking
+    cut = app.build_report(df.copy(), top_n=5)        # a cut at the N the checks below show
+    return full, cut
+
+
+def test_filtered_views_match_full_ranking(reports):
+    full, cut = reports
+    assert len(cut["global_top_students_att"]) < len(full["global_top_students_att"])
+    lists = [(full["global_top_students_att"], cut["global_top_students_att"])]
+    lists += [(rows, cut["module_top_students_att"][m]) for m, rows in full["module_top_students_att"].items()]
+    for qual in [""] + full["qualifications"]:
+        for band in ("", "low", "moderate", "high"):
+            for basis in ("count", "rate"):
+                for full_rows, cut_rows in lists:
+                    assert _shown(cut_rows, qual, band, basis, 5) == _shown(full_rows, qual, band, basis, 5)
+
+
+def test_rest_of_report_unchanged(reports):
+    full, cut = reports
+    assert all(json.dumps(full[k]) == json.dumps(cut[k]) for k in full if "top_students" not in k)
@@ -0,0 +1,151 @@
+"""transform_to_tracker against a frozen copy of the per-student loop it replaced."""
+import re
+
+import pandas as pd
+import pytest
+
+import app
+import synth
+
+
+def legacy_transform_to_tracker(df: pd.DataFrame) -> pd.DataFrame:
+    """transform_to_tracker as it was before vectorization (kept verbatim as the reference)."""
+    df = df.copy()
+    df.columns = [str(c).strip() for c in df.columns]
+
+    def get_col(name):
+        return next((c for c in df.columns if name.lower() in c.lower()), None)
+
+    col_student = get_col("student number")
+    col_qual    = get_col("qualification")
+    col_year    = get_col("year")
+    col_risk    = get_col("risk")
+    col_notes   = get_col("notes")
+    col_reason = get_col("reason")
+    col_interv = next(
+        (c for c in df.columns if "intervention" in c.lower()),
+        None
+    )
+
+    if not col_student or not col_risk:
+        raise ValueError("Required columns (Student Number / Risk) not found.")
+
+    reason_map = {
+        "canvas activity": "Engagement – Canvas",
+        "class attendance": "Engagement – Attendance",
+        "non-participation": "Missing assessment",
+        "poor participation": "Assessment – Failure"
+    }
+
+    df["_sid"] = df[col_student].apply(app._sid)
+    df_high = df[df[col_risk].astype(str).str.contains("high", case=False, na=False)].copy()
+
+    if df_high.empty:
+        raise ValueError("No HIGH risk students found in the file.")
+
+    grouped = df_high.groupby("_sid")
+
+    rows = []
+
+    for sid, g in grouped:
+        programme = g[col_qual].dropna().astype(str).iloc[0] if col_qual else ""
+        year = ""
+        if col_year:
+            vals = g[col_year].dropna().astype(str)
+            if not vals.empty:
+                raw_year = vals.iloc[0]
+                year = re.sub(r"\D", "", raw_year)
+
+        lecturer_action = ""
+        if col_interv:
+            lecturer_action = " | ".join(
+                g[col_interv]
+                .dropna()
+                .astype(str)
+                .str.strip()
+                .unique()
+            )
+
+        notes = ""
+        if col_notes:
+            notes = " | ".join(g[col_notes].dropna().astype(str).unique())
+
+        risk_value = ""
+
+        if col_reason:
+            reasons = g[col_reason].dropna().astype(str).str.lower()
+
+            mapped = []
+
+            for r in reasons:
+                if "canvas activity" in r:
+                    mapped.append(reason_map["canvas activity"])
+                if "class attendance" in r:
+                    mapped.append(reason_map["class attendance"])
+                if "non-participation" in r:
+                    mapped.append(reason_map["non-participation"])
+                if "poor participation" in r:
+                    mapped.append(reason_map["poor participation"])
+
+            risk_value = " | ".join(sorted(set(mapped))) if mapped else "Other"
+        rows.append({
+            "Student Number": sid,
+            "Date": pd.Timestamp.today().strftime("%Y-%m-%d"),
+            "Programme": programme,
+            "Year of study": year,
+            "Risk": risk_value,
+            "Action Taken by Lecturer": lecturer_action,
+            "Action Taken by Academic Manager": "",
+            "Action Taken by Programme Officer": "",
+            "Action Taken by C4AS Manager": "",
+            "Notes": notes
+        })
+
+    new_df = pd.DataFrame(rows)
+    new_df = new_df.drop_duplicates(subset=["Student Number"])
+    return new_df
+
+
+def _handmade() -> pd.DataFrame:
+    """Edge cases: mixed id spellings, padded text, repeated / missing reasons, several risks."""
+    return pd.DataFrame({
+        "Student Number": [201, "201", 201.0, " 202 ", 203, 203, 204, None, 205],
+        "Qualification": ["BBIS", "BBIS", "BIT", "HCS-B", "DIP", "DIP", "BIT", "BIT", "BCOM"],
+        "Year Registered": ["2023", "Year 2023", None, "2024", "2022/3", "2022", None, "2025", "2024"],
+        "Risk": ["High", "HIGH", "Moderate", "high risk", "High", "High", "Low", "High", "High"],
+        "Reason": ["Class Attendance_001", "Canvas Activity_007", "Canvas Activity_007",
+                   "Non-Participation in Formal Assessment_006", None,
+                   "Poor Participation in Formal Assessment_006 / Class Attendance", "Other", "Other", "Absent"],
+        "Intervention": [" Emailed ", "Emailed", None, "Called student", None, "Met", "x", "y", None],
+        "Notes": ["a", "a", "b", None, "c", "d", None, "e", None],
+    })
+
+
+FIXTURES = {
+    "handmade": _handmade,
+    **{f"synth-{seed}": (lambda seed=seed: synth.make_frame(400, students=40, seed=seed)) for seed in range(4)},
+    "synth-skewed": lambda: synth.make_frame(600, students=25, skew=1.5, seed=11),
+}
+
+
+@pytest.mark.parametrize("name", sorted(FIXTURES))
+def test_matches_legacy_loop(name):
+    df = FIXTURES[name]()
+    pd.testing.assert_frame_equal(app.transform_to_tracker(df), legacy_transform_to_tracker(df))
+
+
+@pytest.mark.parametrize("name", sorted(FIXTURES))
+def test_matches_legacy_loop_on_cleaned_frame(name):
+    # the tracker job hands over the cleaned (snapshot) frame
+    df, _ = app.clean_dataframe(FIXTURES[name]())
+    pd.testing.assert_frame_equal(app.transform_to_tracker(df), legacy_transform_to_tracker(df))
+
+
+def test_same_errors_as_legacy_loop():
+    no_high = _handmade().assign(Risk="Low")
+    for df in (no_high, _handmade().drop(columns="Risk")):
+        with pytest.raises(ValueError) as new:
+            app.transform_to_tracker(df)
+        with pytest.raises(ValueError) as old:
+            legacy_transform_to_tracker(df)
+        assert str(new.value) == str(old.value)